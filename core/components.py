@@ -1,4 +1,4 @@
-from .scripting import MonoBehaviour
+from .scripting import MonoBehaviour, Vector3
 
 class Rigidbody(MonoBehaviour):
     """Компонент физического тела"""
@@ -1,3 +1,8 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
 class Entity:
     def __init__(self, entity_id, name="Entity"):
         self.id = entity_id
@@ -17,6 +22,12 @@ class Entity:
     def has_component(self, component_type):
         return component_type in self.components
 
+    def remove_component(self, component_type):
+        component = self.components.pop(component_type, None)
+        if component is not None:
+            component.entity = None
+        return component
+
 class Component:
     def __init__(self):
         self.entity = None
@@ -53,29 +64,259 @@ class CameraComponent(Component):
         self.clear_color = [0.2, 0.2, 0.2, 1.0]
         self.is_main = False
 
+class System:
+    """Базовая система ECS.
+
+    reads/writes перечисляют типы компонентов (классы или имена), к которым
+    система обращается. Системы без пересечений по записи выполняются параллельно.
+    Если не объявлено ни то, ни другое (None по умолчанию), система конфликтует
+    со всеми; пустой кортеж означает, что система эти компоненты не трогает.
+    """
+    reads = None
+    writes = None
+
+    def __init__(self):
+        self.enabled = True
+        self.commands = None  # EntityCommandBuffer текущего кадра
+
+    def update(self, delta_time, entities):
+        pass
+
+def _component_names(types):
+    return frozenset(t if isinstance(t, str) else t.__name__ for t in types)
+
+def _declared_access(system):
+    """(reads, writes) в виде имен или None, если система не объявила доступ"""
+    reads = getattr(system, 'reads', None)
+    writes = getattr(system, 'writes', None)
+    if reads is None and writes is None:
+        return None
+    return _component_names(reads or ()), _component_names(writes or ())
+
+class SystemScheduler:
+    """Строит граф зависимостей систем и выполняет независимые системы на пуле потоков"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.timings = {}
+        self._executor = None
+        self._graph_key = None
+        self._dependents = []
+        self._dependency_counts = []
+
+    def _conflicts(self, a, b):
+        a_access, b_access = _declared_access(a), _declared_access(b)
+        if a_access is None or b_access is None:
+            return True
+        a_reads, a_writes = a_access
+        b_reads, b_writes = b_access
+        return bool(a_writes & (b_reads | b_writes) or b_writes & a_reads)
+
+    def build_graph(self, systems):
+        """Ребро i -> j, если j объявлена позже i и конфликтует с ней"""
+        count = len(systems)
+        self._dependents = [[] for _ in range(count)]
+        self._dependency_counts = [0] * count
+        for j in range(count):
+            for i in range(j):
+                if self._conflicts(systems[i], systems[j]):
+                    self._dependents[i].append(j)
+                    self._dependency_counts[j] += 1
+        self._graph_key = tuple(map(id, systems))
+
+    def _run_system(self, system, delta_time, entities):
+        start = time.perf_counter()
+        system.update(delta_time, entities)
+        return time.perf_counter() - start
+
+    def run(self, manager, systems, delta_time):
+        systems = [s for s in systems if getattr(s, 'enabled', True)]
+        if tuple(map(id, systems)) != self._graph_key:
+            self.build_graph(systems)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="ecs-system")
+
+        # Буферы создаются до запуска, чтобы порядок применения совпадал с порядком систем
+        for system in systems:
+            if hasattr(system, 'commands'):
+                system.commands = manager.create_command_buffer(per_frame=True)
+
+        remaining = list(self._dependency_counts)
+        running = {}
+        for index, system in enumerate(systems):
+            if remaining[index] == 0:
+                future = self._executor.submit(self._run_system, system, delta_time, manager.entities)
+                running[future] = index
+
+        self.timings.clear()
+        error = None
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                system = systems[index]
+                try:
+                    self.timings[type(system).__name__] = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                for dependent in self._dependents[index]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0 and error is None:
+                        future = self._executor.submit(self._run_system, systems[dependent],
+                                                       delta_time, manager.entities)
+                        running[future] = dependent
+        if error is not None:
+            raise error
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+class EntityCommandBuffer:
+    """Записывает структурные изменения и применяет их пакетом в точке синхронизации.
+
+    Буфер принадлежит одной системе/потоку, поэтому запись не требует блокировок.
+    Идентификаторы для новых сущностей резервируются сразу, так что на созданную
+    сущность можно ссылаться в последующих командах того же кадра.
+    """
+    CREATE = 0
+    DESTROY = 1
+    ADD_COMPONENT = 2
+    REMOVE_COMPONENT = 3
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.commands = []
+
+    def create_entity(self, name="Entity"):
+        entity = Entity(self.manager._reserve_entity_id(), name)
+        entity.add_component(TransformComponent())
+        self.commands.append((self.CREATE, entity, None))
+        return entity
+
+    def destroy_entity(self, entity_id):
+        self.commands.append((self.DESTROY, entity_id, None))
+
+    def add_component(self, entity_id, component):
+        self.commands.append((self.ADD_COMPONENT, entity_id, component))
+
+    def remove_component(self, entity_id, component_type):
+        self.commands.append((self.REMOVE_COMPONENT, entity_id, component_type))
+
+    def playback(self, entities):
+        for command, target, payload in self.commands:
+            if command == self.CREATE:
+                entities[target.id] = target
+                continue
+
+            entity = entities.get(target)
+            if entity is None:
+                continue
+            if command == self.DESTROY:
+                del entities[target]
+            elif command == self.ADD_COMPONENT:
+                entity.add_component(payload)
+            elif command == self.REMOVE_COMPONENT:
+                entity.remove_component(payload)
+        self.commands.clear()
+
+    def __len__(self):
+        return len(self.commands)
+
 class ECSManager:
     def __init__(self):
         self.entities = {}
         self.systems = []
         self.next_entity_id = 0
-        
+        self.command_buffers = []
+        self._frame_buffers = set()  # id буферов, созданных update на один кадр
+        self._entity_ids = itertools.count()
+        self._deferred_commands = None
+        self.parallel = False
+        self.scheduler = SystemScheduler()
+
+    @property
+    def system_timings(self):
+        """Время последнего update каждой системы в секундах"""
+        return self.scheduler.timings
+
+    def _reserve_entity_id(self):
+        # next() у itertools.count атомарен под GIL
+        entity_id = next(self._entity_ids)
+        self.next_entity_id = entity_id + 1
+        return entity_id
+
     def create_entity(self, name="Entity"):
-        entity_id = self.next_entity_id
-        self.next_entity_id += 1
-        entity = Entity(entity_id, name)
-        self.entities[entity_id] = entity
+        # Во время update структурные изменения откладываются до точки синхронизации
+        if self._deferred_commands is not None:
+            return self._deferred_commands.create_entity(name)
+
+        entity = Entity(self._reserve_entity_id(), name)
+        self.entities[entity.id] = entity
         
         # Add transform component by default
         entity.add_component(TransformComponent())
         return entity
         
     def destroy_entity(self, entity_id):
+        if self._deferred_commands is not None:
+            self._deferred_commands.destroy_entity(entity_id)
+            return
+
         if entity_id in self.entities:
             del self.entities[entity_id]
+
+    def create_command_buffer(self, per_frame=False):
+        """Новый буфер команд. Буфер пользователя остается зарегистрированным и
+        проигрывается в каждой точке синхронизации; буферы кадра (per_frame),
+        которые создает update, удаляются после проигрывания"""
+        buffer = EntityCommandBuffer(self)
+        self.command_buffers.append(buffer)
+        if per_frame:
+            self._frame_buffers.add(id(buffer))
+        return buffer
+
+    def release_command_buffer(self, buffer):
+        """Перестать проигрывать буфер, полученный из create_command_buffer"""
+        if buffer in self.command_buffers:
+            self.command_buffers.remove(buffer)
+        self._frame_buffers.discard(id(buffer))
+
+    def playback_commands(self):
+        """Применить все записанные команды (точка синхронизации)"""
+        for buffer in self.command_buffers:
+            buffer.playback(self.entities)
+        if self._frame_buffers:
+            frame_buffers = self._frame_buffers
+            self.command_buffers = [buffer for buffer in self.command_buffers
+                                    if id(buffer) not in frame_buffers]
+            frame_buffers.clear()
             
     def add_system(self, system):
         self.systems.append(system)
         
     def update(self, delta_time):
+        self._deferred_commands = self.create_command_buffer(per_frame=True)
+        try:
+            if self.parallel:
+                self.scheduler.run(self, self.systems, delta_time)
+            else:
+                self._update_sequential(delta_time)
+        finally:
+            self._deferred_commands = None
+            self.playback_commands()
+
+    def _update_sequential(self, delta_time):
+        timings = self.scheduler.timings
+        timings.clear()
         for system in self.systems:
-            system.update(delta_time, self.entities)
\ No newline at end of file
+            if not getattr(system, 'enabled', True):
+                continue
+            if hasattr(system, 'commands'):
+                system.commands = self.create_command_buffer(per_frame=True)
+            start = time.perf_counter()
+            system.update(delta_time, self.entities)
+            timings[type(system).__name__] = time.perf_counter() - start
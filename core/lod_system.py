@@ -1,34 +1,216 @@
+import math
+import time
+from collections import deque
+import numpy as np
+
 class LODLevel:
-    def __init__(self, distance, mesh_complexity):
-        self.distance = distance
+    def __init__(self, screen_size, mesh_complexity, mesh_data=None):
+        self.screen_size = screen_size  # Минимальная доля высоты экрана для этого уровня
         self.mesh_complexity = mesh_complexity  # e.g., triangle count
-        self.mesh_data = None
+        self.mesh_data = mesh_data
 
 class LODSystem:
-    def __init__(self):
-        self.lod_levels = {}
-        self.current_lod = {}
-        
-    def add_lod_level(self, object_name, distance, mesh_complexity):
-        if object_name not in self.lod_levels:
-            self.lod_levels[object_name] = []
-        
-        self.lod_levels[object_name].append(LODLevel(distance, mesh_complexity))
-        self.lod_levels[object_name].sort(key=lambda x: x.distance)
-        
-    def update_lod(self, camera_position, objects):
-        for obj in objects:
-            if obj.name in self.lod_levels:
-                distance = self._calculate_distance(camera_position, obj.position)
-                appropriate_lod = self._get_appropriate_lod(obj.name, distance)
-                self.current_lod[obj.name] = appropriate_lod
-                
-    def _calculate_distance(self, pos1, pos2):
-        return ((pos1[0]-pos2[0])**2 + (pos1[1]-pos2[1])**2 + (pos1[2]-pos2[2])**2)**0.5
+    """Выбор LOD по экранному размеру объекта с гистерезисом.
+
+    Уровни хранятся по идентичности объекта, а не по имени. Оценка выполняется
+    векторно для всех зарегистрированных объектов сразу; выбранный уровень
+    записывается в obj.lod_level и используется GameObject.draw.
+    """
+
+    def __init__(self, fov=60.0, hysteresis=0.1, time_sliced=None):
+        self.lod_levels = {}  # obj -> [LODLevel], от детального к грубому
+        self.current_lod = {}  # obj -> LODLevel
+        self.fov = fov
+        self.hysteresis = hysteresis  # Относительная ширина полосы вокруг порогов
+
+        # Режим с разбиением по кадрам: за кадр пересчитывается только часть объектов.
+        # None - включается сам, когда объектов больше slice_size
+        self.time_sliced = time_sliced
+        self.slice_size = 256  # Объектов за кадр
+        self.chunk_size = 64  # Объектов между проверками бюджета
+        # Бюджет на кадр, мкс; проверяется только между порциями по chunk_size,
+        # и одна порция выполняется всегда, так что его можно превысить на порцию
+        self.time_budget_us = 500
+        self.threshold_margin = 0.25  # Объекты ближе к порогу считаются приоритетными
+        self.last_evaluated = 0
+        self.last_update_us = 0.0
+        self._cursor = 0
+        self._priority_queue = deque()
+        self._priority_rows = set()
+
+        self._objects = []
+        self._rows = {}  # obj -> строка в массивах
+        self._thresholds = np.empty((0, 0))
+        self._level_counts = np.empty(0, dtype=int)
+        self._current_index = np.empty(0, dtype=int)
+        self._arrays_dirty = False
+
+    def add_lod_level(self, obj, screen_size, mesh_complexity, mesh_data=None):
+        if obj not in self.lod_levels:
+            self.lod_levels[obj] = []
+            self._rows[obj] = len(self._objects)
+            self._objects.append(obj)
+
+        self.lod_levels[obj].append(LODLevel(screen_size, mesh_complexity, mesh_data))
+        self.lod_levels[obj].sort(key=lambda x: -x.screen_size)
+        self._arrays_dirty = True
+
+    def remove_object(self, obj):
+        if obj not in self.lod_levels:
+            return
+        del self.lod_levels[obj]
+        self.current_lod.pop(obj, None)
+        obj.lod_level = None
+        self._objects.remove(obj)
+        self._rows = {o: i for i, o in enumerate(self._objects)}
+        self._arrays_dirty = True
+
+    def mark_moved(self, obj):
+        """Поставить объект в приоритетную очередь (сильно сдвинулся)"""
+        row = self._rows.get(obj)
+        if row is not None and row not in self._priority_rows:
+            self._priority_rows.add(row)
+            self._priority_queue.append(row)
+
+    def clear(self):
+        for obj in self._objects:
+            obj.lod_level = None
+        self.lod_levels.clear()
+        self.current_lod.clear()
+        self._objects = []
+        self._rows = {}
+        self._arrays_dirty = True
+
+    def _rebuild_arrays(self):
+        """Пороги всех объектов в матрицу (N, max_levels), недостающие = -inf"""
+        count = len(self._objects)
+        max_levels = max((len(levels) for levels in self.lod_levels.values()), default=0)
+        self._thresholds = np.full((count, max_levels), -np.inf)
+        self._level_counts = np.zeros(count, dtype=int)
+        current = np.full(count, -1)  # -1: уровень еще не выбран
+        for row, obj in enumerate(self._objects):
+            levels = self.lod_levels[obj]
+            self._thresholds[row, :len(levels)] = [level.screen_size for level in levels]
+            self._level_counts[row] = len(levels)
+            if obj in self.current_lod and self.current_lod[obj] in levels:
+                current[row] = levels.index(self.current_lod[obj])
+        self._current_index = current
+        self._cursor = 0
+        self._priority_queue = deque()
+        self._priority_rows = set()
+        self._arrays_dirty = False
+
+    def screen_sizes(self, camera_position, objects, projection_scale=None):
+        """Доля высоты экрана, занимаемая ограничивающей сферой каждого объекта"""
+        if projection_scale is None:
+            projection_scale = 1.0 / math.tan(math.radians(self.fov) / 2)
+        positions = np.array([obj.position for obj in objects], dtype=np.float64).reshape(-1, 3)
+        scales = np.array([obj.scale for obj in objects], dtype=np.float64).reshape(-1, 3)
+        radii = 0.5 * np.linalg.norm(scales, axis=1)
+        distances = np.linalg.norm(positions - np.asarray(camera_position, dtype=np.float64), axis=1)
+        return radii * projection_scale / np.maximum(distances, 1e-6)
+
+    def _select_levels(self, sizes, rows):
+        thresholds = self._thresholds[rows]
+        last = self._level_counts[rows] - 1
+        current = self._current_index[rows]
+
+        # Переход на грубый уровень только ниже порога с запасом, на детальный - выше
+        coarser = np.minimum(np.sum(thresholds > (sizes * (1 + self.hysteresis))[:, None], axis=1), last)
+        finer = np.minimum(np.sum(thresholds > (sizes * (1 - self.hysteresis))[:, None], axis=1), last)
+        selected = np.where(coarser > current, coarser, np.where(finer < current, finer, current))
+        exact = np.minimum(np.sum(thresholds > sizes[:, None], axis=1), last)
+        return np.where(current < 0, exact, selected)
+
+    def update_lod(self, camera_position, projection_scale=None):
+        if not self._objects:
+            return
+        if self._arrays_dirty:
+            self._rebuild_arrays()
+
+        if self.time_sliced or (self.time_sliced is None and len(self._objects) > self.slice_size):
+            self._update_time_sliced(camera_position, projection_scale)
+            return
+
+        rows = np.arange(len(self._objects))
+        sizes = self.screen_sizes(camera_position, self._objects, projection_scale)
+        self._apply(rows, self._select_levels(sizes, rows))
+        self.last_evaluated = len(rows)
+
+    def _update_time_sliced(self, camera_position, projection_scale):
+        """Пересчитать приоритетные объекты и очередной срез, укладываясь в бюджет"""
+        start = time.perf_counter_ns()
+        deadline = start + int(self.time_budget_us * 1000)
+        count = len(self._objects)
+
+        # Половина среза - объектам у порогов и сдвинувшимся, остальное - по кругу
+        priority = []
+        while self._priority_queue and len(priority) < self.slice_size // 2:
+            row = self._priority_queue.popleft()
+            self._priority_rows.discard(row)
+            if row < count:
+                priority.append(row)
+        # Строки, уже взятые из очереди, в круговом срезе не повторяются
+        span = (self._cursor + np.arange(min(self.slice_size - len(priority), count))) % count
+        kept = np.flatnonzero(~np.isin(span, priority))
+        batch = np.concatenate([np.array(priority, dtype=int), span[kept]])
+
+        processed = 0
+        while processed < len(batch):
+            # Хотя бы одна порция за кадр, чтобы гарантировать прогресс
+            if processed and time.perf_counter_ns() >= deadline:
+                break
+            rows = batch[processed:processed + self.chunk_size]
+            objects = [self._objects[row] for row in rows]
+            sizes = self.screen_sizes(camera_position, objects, projection_scale)
+            self._apply(rows, self._select_levels(sizes, rows))
+            self._queue_near_thresholds(rows, sizes)
+            processed += len(rows)
+
+        for row in priority[processed:]:
+            self.mark_moved(self._objects[row])
+        # Строки среза, ушедшие в приоритетные, курсор тоже проходит
+        rotated = max(0, processed - len(priority))
+        advance = kept[rotated] if rotated < len(kept) else len(span)
+        self._cursor = (self._cursor + int(advance)) % count
+        self.last_evaluated = processed
+        self.last_update_us = (time.perf_counter_ns() - start) / 1000.0
+
+    def _queue_near_thresholds(self, rows, sizes):
+        thresholds = self._thresholds[rows]
+        near = np.any(np.abs(thresholds - sizes[:, None]) < thresholds * self.threshold_margin, axis=1)
+        for row in rows[near]:
+            if row not in self._priority_rows:
+                self._priority_rows.add(row)
+                self._priority_queue.append(row)
+
+    def _apply(self, rows, selected):
+        # Python-код только для объектов, у которых уровень изменился
+        changed = np.nonzero(selected != self._current_index[rows])[0]
+        self._current_index[rows] = selected
+        for i in changed:
+            obj = self._objects[rows[i]]
+            level = self.lod_levels[obj][selected[i]]
+            self.current_lod[obj] = level
+            obj.lod_level = level
+
+    def add_generated_levels(self, obj, vertices, screen_sizes=(0.3, 0.1, 0.03, 0.01),
+                             ratios=(0.5, 0.25, 0.1), mesh_factory=None, generator=None):
+        """Уровень 0 - исходный obj.mesh, остальные строятся упрощением vertices.
+
+        vertices - массив вершин Mesh (8 float на вершину). Упрощенные меши
+        кэшируются на диске, поэтому генерация выполняется один раз на ассет.
+        """
+        from .mesh_simplification import LODChainGenerator, FLOATS_PER_VERTEX
         
-    def _get_appropriate_lod(self, object_name, distance):
-        levels = self.lod_levels.get(object_name, [])
-        for level in levels:
-            if distance <= level.distance:
-                return level
-        return levels[-1] if levels else None
\ No newline at end of file
+        if generator is None:
+            generator = LODChainGenerator()
+        if mesh_factory is None:
+            from .renderer import Mesh
+            mesh_factory = Mesh
+
+        floats_per_triangle = FLOATS_PER_VERTEX * 3
+        self.add_lod_level(obj, screen_sizes[0], len(vertices) // floats_per_triangle, obj.mesh)
+        for screen_size, lod_vertices in zip(screen_sizes[1:], generator.generate(vertices, ratios)):
+            self.add_lod_level(obj, screen_size, len(lod_vertices) // floats_per_triangle,
+                               mesh_factory(lod_vertices))
@@ -0,0 +1,253 @@
+import hashlib
+import heapq
+import os
+import numpy as np
+
+# Меш в формате core/renderer.py: 8 float на вершину (позиция, нормаль, UV), без индексов
+FLOATS_PER_VERTEX = 8
+_CACHE_VERSION = b"qem-2"
+
+def _weld_vertices(vertices, precision=1e-5, normal_precision=1e-4):
+    """Сварка вершин по позиции для топологии; нормаль и UV остаются у углов граней.
+
+    Возвращает позиции (V, 3), атрибуты (A, 8), грани по позициям (F, 3) и углы
+    граней по атрибутам (F, 3). Атрибут - уникальная тройка позиция/нормаль/UV,
+    поэтому на жестких ребрах и швах UV у одной позиции несколько атрибутов.
+    """
+    data = np.asarray(vertices, dtype=np.float32).reshape(-1, FLOATS_PER_VERTEX)
+    position_keys = np.round(data[:, :3] / precision).astype(np.int64)
+    attribute_keys = np.concatenate([position_keys,
+                                     np.round(data[:, 3:6] / normal_precision).astype(np.int64),
+                                     np.round(data[:, 6:8] / precision).astype(np.int64)], axis=1)
+    _, position_first, position_inverse = np.unique(position_keys, axis=0, return_index=True,
+                                                    return_inverse=True)
+    _, attribute_first, attribute_inverse = np.unique(attribute_keys, axis=0, return_index=True,
+                                                      return_inverse=True)
+    positions = data[position_first, :3].astype(np.float64)
+    attributes = data[attribute_first].astype(np.float64)
+    faces = position_inverse.reshape(-1, 3)
+    corners = attribute_inverse.reshape(-1, 3)
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return positions, attributes, faces[keep], corners[keep]
+
+def _plane_quadrics(positions, faces, corners, boundary_weight):
+    """Квадрики ошибок вершин: сумма квадратов расстояний до плоскостей граней.
+
+    Граничные ребра и швы (ребро, у граней которого разные атрибуты на концах:
+    жесткая нормаль или разрез UV) удерживаются перпендикулярными плоскостями
+    с каждой стороны, чтобы стягивания не сдвигали их поперек.
+    """
+    points = positions[faces]
+    normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    valid = lengths > 1e-12
+    normals[valid] /= lengths[valid, None]
+    areas = lengths * 0.5
+
+    planes = np.concatenate([normals, -np.einsum('ij,ij->i', normals, points[:, 0])[:, None]], axis=1)
+    face_quadrics = planes[:, :, None] * planes[:, None, :] * areas[:, None, None]
+
+    quadrics = np.zeros((len(positions), 4, 4))
+    for k in range(3):
+        np.add.at(quadrics, faces[:, k], face_quadrics)
+
+    # Вхождения ребер в грани; концы упорядочены, атрибуты углов - в том же порядке
+    pairs = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    attribute_pairs = np.concatenate([corners[:, [0, 1]], corners[:, [1, 2]], corners[:, [2, 0]]])
+    swap = pairs[:, 0] > pairs[:, 1]
+    pairs[swap] = pairs[swap][:, ::-1]
+    attribute_pairs[swap] = attribute_pairs[swap][:, ::-1]
+    edge_faces = np.tile(np.arange(len(faces)), 3)
+
+    _, edge_ids, counts = np.unique(pairs, axis=0, return_inverse=True, return_counts=True)
+    edge_ids = edge_ids.reshape(-1)
+    # Шов: у одного ребра больше одного варианта атрибутов на концах
+    variants = np.unique(np.concatenate([edge_ids[:, None], attribute_pairs], axis=1), axis=0)
+    seam = np.bincount(variants[:, 0], minlength=len(counts)) > 1
+    constrained = (counts == 1)[edge_ids] | seam[edge_ids]
+    if constrained.any():
+        a, b = pairs[constrained, 0], pairs[constrained, 1]
+        face_normals = normals[edge_faces[constrained]]
+        direction = positions[b] - positions[a]
+        perpendicular = np.cross(direction, face_normals)
+        plength = np.linalg.norm(perpendicular, axis=1)
+        ok = plength > 1e-12
+        perpendicular[ok] /= plength[ok, None]
+        bplanes = np.concatenate([perpendicular,
+                                  -np.einsum('ij,ij->i', perpendicular, positions[a])[:, None]], axis=1)
+        weights = boundary_weight * np.einsum('ij,ij->i', direction, direction)
+        bquadrics = bplanes[:, :, None] * bplanes[:, None, :] * weights[:, None, None]
+        np.add.at(quadrics, a, bquadrics)
+        np.add.at(quadrics, b, bquadrics)
+
+    return quadrics
+
+def _quadric_error(quadric, position):
+    v = np.append(position, 1.0)
+    return float(v @ quadric @ v)
+
+def _collapse_target(quadric, pa, pb):
+    """Оптимальная позиция для стягивания ребра и ее ошибка"""
+    a = quadric[:3, :3]
+    if abs(np.linalg.det(a)) > 1e-10:
+        position = np.linalg.solve(a, -quadric[:3, 3])
+        return _quadric_error(quadric, position), position
+    candidates = (pa, pb, (pa + pb) * 0.5)
+    errors = [_quadric_error(quadric, c) for c in candidates]
+    best = int(np.argmin(errors))
+    return errors[best], candidates[best]
+
+def _wedge_normals(positions, faces, corners, attributes):
+    """Нормали атрибутов: сглаживание только по граням с тем же атрибутом угла,
+    поэтому жесткие ребра остаются жесткими"""
+    points = positions[faces]
+    face_normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+    normals = np.zeros((len(attributes), 3))
+    for k in range(3):
+        np.add.at(normals, corners[:, k], face_normals)
+    lengths = np.linalg.norm(normals, axis=1)
+    unused = lengths < 1e-12
+    normals[unused] = attributes[unused, 3:6]
+    lengths[unused] = 1.0
+    return normals / lengths[:, None]
+
+def simplify_mesh(vertices, target_ratio, boundary_weight=100.0):
+    """Упростить меш стягиванием ребер по метрике квадрик ошибок (Garland-Heckbert).
+
+    vertices - плоский массив по 8 float на вершину (как у Mesh). Возвращает
+    массив того же формата, содержащий примерно target_ratio исходных треугольников.
+    """
+    positions, attributes, faces, corners = _weld_vertices(vertices)
+    if len(faces) == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    quadrics = _plane_quadrics(positions, faces, corners, boundary_weight)
+    faces = faces.tolist()
+    corners = corners.tolist()
+    face_alive = [True] * len(faces)
+    vertex_faces = [set() for _ in range(len(positions))]
+    for f, face in enumerate(faces):
+        for v in face:
+            vertex_faces[v].add(f)
+
+    removed = [False] * len(positions)
+    versions = [0] * len(positions)
+    heap = []
+
+    def neighbors(v):
+        result = set()
+        for f in vertex_faces[v]:
+            result.update(faces[f])
+        result.discard(v)
+        return result
+
+    def push_edge(u, v):
+        cost, target = _collapse_target(quadrics[u] + quadrics[v], positions[u], positions[v])
+        heapq.heappush(heap, (cost, u, v, versions[u], versions[v], target))
+
+    for u in range(len(positions)):
+        for v in neighbors(u):
+            if u < v:
+                push_edge(u, v)
+
+    face_count = len(faces)
+    target_faces = max(1, int(face_count * target_ratio))
+
+    while face_count > target_faces and heap:
+        _, u, v, version_u, version_v, target = heapq.heappop(heap)
+        if removed[u] or removed[v] or versions[u] != version_u or versions[v] != version_v:
+            continue
+
+        shared = vertex_faces[u] & vertex_faces[v]
+        # Условие связности: общие соседи только через общие грани, иначе меш станет неманифолдным
+        if len(neighbors(u) & neighbors(v)) != len(shared):
+            continue
+        if _collapse_flips(faces, positions, vertex_faces[u] | vertex_faces[v], shared, (u, v), target):
+            continue
+
+        positions[u] = target
+        quadrics[u] += quadrics[v]
+        removed[v] = True
+        versions[u] += 1
+
+        # Углы v переходят на атрибут u из той же общей грани (тот же "клин" вокруг шва)
+        wedges = {}
+        for f in shared:
+            face = faces[f]
+            wedges[corners[f][face.index(v)]] = corners[f][face.index(u)]
+
+        for f in shared:
+            face_alive[f] = False
+            for w in faces[f]:
+                if w != u and w != v:
+                    vertex_faces[w].discard(f)
+            face_count -= 1
+        vertex_faces[u] -= shared
+        for f in vertex_faces[v] - shared:
+            k = faces[f].index(v)
+            faces[f][k] = u
+            corners[f][k] = wedges.get(corners[f][k], corners[f][k])
+            vertex_faces[u].add(f)
+        vertex_faces[v] = set()
+
+        for w in neighbors(u):
+            push_edge(u, w)
+
+    alive = [f for f in range(len(faces)) if face_alive[f]]
+    faces = np.array([faces[f] for f in alive], dtype=np.int64).reshape(-1, 3)
+    corners = np.array([corners[f] for f in alive], dtype=np.int64).reshape(-1, 3)
+    attributes[:, 3:6] = _wedge_normals(positions, faces, corners, attributes)
+    result = attributes[corners]
+    result[:, :, :3] = positions[faces]
+    return result.astype(np.float32).reshape(-1)
+
+def _collapse_flips(faces, positions, affected, shared, edge, target):
+    """Проверить, не перевернется ли какая-либо оставшаяся грань после стягивания"""
+    for f in affected:
+        if f in shared:
+            continue
+        corners = [positions[w] for w in faces[f]]
+        before = np.cross(corners[1] - corners[0], corners[2] - corners[0])
+        moved = [target if w in edge else positions[w] for w in faces[f]]
+        after = np.cross(moved[1] - moved[0], moved[2] - moved[0])
+        if np.dot(before, after) <= 0.0:
+            return True
+    return False
+
+class LODChainGenerator:
+    """Генерация цепочки LOD-мешей с кэшем на диске по хэшу исходника"""
+
+    def __init__(self, cache_directory=os.path.join("assets", ".lod_cache")):
+        self.cache_directory = cache_directory
+
+    def cache_key(self, vertices, ratios):
+        data = np.ascontiguousarray(vertices, dtype=np.float32)
+        digest = hashlib.sha1(_CACHE_VERSION)
+        digest.update(data.tobytes())
+        digest.update(repr(tuple(float(r) for r in ratios)).encode())
+        return digest.hexdigest()
+
+    def generate(self, vertices, ratios=(0.5, 0.25, 0.125)):
+        """Список упрощенных мешей (по одному на ratio) в формате Mesh"""
+        key = self.cache_key(vertices, ratios)
+        cache_path = os.path.join(self.cache_directory, f"{key}.npz")
+
+        if os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as cached:
+                    return [cached[f"lod{i}"] for i in range(len(ratios))]
+            except Exception as e:
+                print(f"Error reading LOD cache {cache_path}: {e}")
+
+        # Каждый уровень строится из исходника, чтобы ошибки не накапливались
+        chain = [simplify_mesh(vertices, ratio) for ratio in ratios]
+
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            temp_path = cache_path + ".tmp.npz"
+            np.savez_compressed(temp_path, **{f"lod{i}": lod for i, lod in enumerate(chain)})
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Error writing LOD cache {cache_path}: {e}")
+
+        return chain
@@ -33,6 +33,7 @@ class GameObject:
         
         # Modern OpenGL properties
         self.mesh = None
+        self.lod_level = None  # Выбирается LODSystem
         self.material_lib = None
         self._scene = None  # Reference to parent scene
         
@@ -43,16 +44,23 @@ class GameObject:
         if not self.visible:
             return
             
-        if self.mesh and hasattr(self, '_scene') and self._scene and hasattr(self._scene, 'camera_position'):
+        if self.get_draw_mesh() and hasattr(self, '_scene') and self._scene and hasattr(self._scene, 'camera_position'):
             # Modern OpenGL rendering
             self._draw_modern(shader)
         else:
             # Fallback to legacy rendering
             self._draw_legacy()
     
+    def get_draw_mesh(self):
+        """Mesh of the selected LOD level, falling back to the base mesh"""
+        if self.lod_level is not None and self.lod_level.mesh_data is not None:
+            return self.lod_level.mesh_data
+        return self.mesh
+    
     def _draw_modern(self, shader):
         """Modern OpenGL rendering"""
-        if not self.mesh or not shader:
+        mesh = self.get_draw_mesh()
+        if not mesh or not shader:
             return
             
         # Set material
@@ -70,7 +78,7 @@ class GameObject:
         shader.set_uniform("model", model_matrix)
         
         # Draw mesh
-        self.mesh.draw()
+        mesh.draw()
     
     def _draw_legacy(self):
         """Legacy OpenGL rendering (fallback)"""
@@ -0,0 +1,183 @@
+import math
+import numpy as np
+
+# Треугольники куба по индексам углов (бит 0 - x, бит 1 - y, бит 2 - z)
+_BOX_TRIANGLES = np.array([
+    [0, 2, 3], [0, 3, 1],  # -z
+    [4, 5, 7], [4, 7, 6],  # +z
+    [0, 4, 6], [0, 6, 2],  # -x
+    [1, 3, 7], [1, 7, 5],  # +x
+    [0, 1, 5], [0, 5, 4],  # -y
+    [2, 6, 7], [2, 7, 3],  # +y
+])
+
+def _box_corners(bounds):
+    """Углы боксов формы (N, 8, 4) в однородных координатах"""
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 6)
+    corners = np.empty((len(bounds), 8, 4))
+    for i in range(8):
+        corners[:, i, 0] = bounds[:, 3] if i & 1 else bounds[:, 0]
+        corners[:, i, 1] = bounds[:, 4] if i & 2 else bounds[:, 1]
+        corners[:, i, 2] = bounds[:, 5] if i & 4 else bounds[:, 2]
+    corners[:, :, 3] = 1.0
+    return corners
+
+class OcclusionCuller:
+    """Программное отсечение перекрытых объектов по иерархическому Z-буферу.
+
+    Крупные окклюдеры растеризуются NumPy в буфер глубины низкого разрешения,
+    из которого строится пирамида максимумов (Hi-Z). AABB объекта отсекается,
+    если его ближайшая глубина дальше максимальной глубины под его экранным
+    прямоугольником. Не использует OpenGL и работает без GPU.
+    """
+
+    def __init__(self, width=256, height=128, max_occluders=32, depth_bias=1e-4):
+        self.width = width
+        self.height = height
+        self.max_occluders = max_occluders
+        self.depth_bias = depth_bias
+        self.depth = np.ones((height, width), dtype=np.float32)
+        self.pyramid = [self.depth]
+        self.clip_matrix = None
+        self.camera_position = None
+
+        # Статистика последнего кадра
+        self.tested = 0
+        self.culled = 0
+
+    @property
+    def culled_percentage(self):
+        return 100.0 * self.culled / self.tested if self.tested else 0.0
+
+    def begin_frame(self, view, projection, camera_position=None):
+        """Подготовить кадр по матрицам вида и проекции (строчная запись)"""
+        self.clip_matrix = np.asarray(projection, dtype=np.float64) @ np.asarray(view, dtype=np.float64)
+        self.camera_position = None if camera_position is None else np.asarray(camera_position, dtype=np.float64)
+        self.depth.fill(1.0)
+        self.tested = 0
+        self.culled = 0
+
+    def render_occluders(self, occluder_bounds):
+        """Растеризовать боксы окклюдеров (только самые крупные на экране) и построить пирамиду"""
+        if len(occluder_bounds):
+            occluder_bounds = np.asarray(occluder_bounds, dtype=np.float64).reshape(-1, 6)
+            occluder_bounds = self._select_occluders(occluder_bounds)
+            clip = _box_corners(occluder_bounds) @ self.clip_matrix.T
+            for box in clip:
+                self._rasterize_box(box)
+        self.build_pyramid()
+
+    def _select_occluders(self, bounds):
+        if len(bounds) <= self.max_occluders or self.camera_position is None:
+            return bounds[:self.max_occluders]
+        # Оценка телесного угла: квадрат размера на квадрат расстояния
+        sizes = np.linalg.norm(bounds[:, 3:] - bounds[:, :3], axis=1)
+        centers = (bounds[:, 3:] + bounds[:, :3]) * 0.5
+        distances = np.sum((centers - self.camera_position) ** 2, axis=1)
+        scores = sizes * sizes / np.maximum(distances, 1e-6)
+        order = np.argsort(-scores)[:self.max_occluders]
+        return bounds[order]
+
+    def _rasterize_box(self, clip_corners):
+        # Треугольники, пересекающие ближнюю плоскость, пропускаются (консервативно)
+        w = clip_corners[:, 3]
+        ndc = clip_corners[:, :3] / np.where(w > 1e-6, w, 1.0)[:, None]
+        xs = (ndc[:, 0] * 0.5 + 0.5) * self.width
+        ys = (ndc[:, 1] * 0.5 + 0.5) * self.height
+        zs = ndc[:, 2] * 0.5 + 0.5
+        in_front = w > 1e-6
+
+        for a, b, c in _BOX_TRIANGLES:
+            if in_front[a] and in_front[b] and in_front[c]:
+                self._rasterize_triangle(xs[a], ys[a], zs[a], xs[b], ys[b], zs[b], xs[c], ys[c], zs[c])
+
+    def _rasterize_triangle(self, x0, y0, z0, x1, y1, z1, x2, y2, z2):
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        if abs(area) < 1e-9:
+            return
+
+        min_x = max(int(math.floor(min(x0, x1, x2))), 0)
+        max_x = min(int(math.ceil(max(x0, x1, x2))), self.width - 1)
+        min_y = max(int(math.floor(min(y0, y1, y2))), 0)
+        max_y = min(int(math.ceil(max(y0, y1, y2))), self.height - 1)
+        if min_x > max_x or min_y > max_y:
+            return
+
+        px = np.arange(min_x, max_x + 1) + 0.5
+        py = (np.arange(min_y, max_y + 1) + 0.5)[:, None]
+        inv_area = 1.0 / area
+        b0 = ((x1 - px) * (y2 - py) - (x2 - px) * (y1 - py)) * inv_area
+        b1 = ((x2 - px) * (y0 - py) - (x0 - px) * (y2 - py)) * inv_area
+        b2 = 1.0 - b0 - b1
+        inside = (b0 >= 0) & (b1 >= 0) & (b2 >= 0)
+        if not inside.any():
+            return
+
+        z = np.where(inside, b0 * z0 + b1 * z1 + b2 * z2, 1.0)
+        region = self.depth[min_y:max_y + 1, min_x:max_x + 1]
+        np.minimum(region, z, out=region)
+
+    def build_pyramid(self):
+        """Пирамида максимумов глубины: каждый уровень - max по блокам 2x2"""
+        self.pyramid = [self.depth]
+        level = self.depth
+        while level.shape[0] > 1 or level.shape[1] > 1:
+            h, w = level.shape
+            padded = np.ones(((h + 1) // 2 * 2, (w + 1) // 2 * 2), dtype=np.float32)
+            padded[:h, :w] = level
+            level = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).max(axis=(1, 3))
+            self.pyramid.append(level)
+
+    def test_aabbs(self, bounds):
+        """Маска видимости для боксов формы (N, 6)"""
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 6)
+        count = len(bounds)
+        visible = np.ones(count, dtype=bool)
+        if count == 0 or self.clip_matrix is None:
+            return visible
+
+        clip = _box_corners(bounds) @ self.clip_matrix.T
+        w = clip[:, :, 3]
+        # Боксы, пересекающие ближнюю плоскость, считаются видимыми
+        testable = np.all(w > 1e-6, axis=1)
+        ndc = clip[:, :, :3] / np.where(w > 1e-6, w, 1.0)[:, :, None]
+
+        min_x = (ndc[:, :, 0].min(axis=1) * 0.5 + 0.5) * self.width
+        max_x = (ndc[:, :, 0].max(axis=1) * 0.5 + 0.5) * self.width
+        min_y = (ndc[:, :, 1].min(axis=1) * 0.5 + 0.5) * self.height
+        max_y = (ndc[:, :, 1].max(axis=1) * 0.5 + 0.5) * self.height
+        nearest = ndc[:, :, 2].min(axis=1) * 0.5 + 0.5
+
+        # Полностью за экраном - дело отсечения по пирамиде видимости
+        testable &= (max_x >= 0) & (min_x < self.width) & (max_y >= 0) & (min_y < self.height)
+        min_x = np.clip(min_x, 0, self.width - 1)
+        max_x = np.clip(max_x, 0, self.width - 1)
+        min_y = np.clip(min_y, 0, self.height - 1)
+        max_y = np.clip(max_y, 0, self.height - 1)
+
+        # Уровень, на котором прямоугольник покрывает не больше 2x2 текселей
+        extent = np.maximum(max_x - min_x, max_y - min_y)
+        levels = np.ceil(np.log2(np.maximum(extent, 1.0))).astype(int)
+        levels = np.minimum(levels, len(self.pyramid) - 1)
+
+        for level in np.unique(levels[testable]):
+            selected = np.nonzero(testable & (levels == level))[0]
+            texels = self.pyramid[level]
+            scale = float(1 << level)
+            x0 = np.minimum((min_x[selected] / scale).astype(int), texels.shape[1] - 1)
+            x1 = np.minimum((max_x[selected] / scale).astype(int), texels.shape[1] - 1)
+            y0 = np.minimum((min_y[selected] / scale).astype(int), texels.shape[0] - 1)
+            y1 = np.minimum((max_y[selected] / scale).astype(int), texels.shape[0] - 1)
+            farthest = np.maximum.reduce([texels[y0, x0], texels[y0, x1], texels[y1, x0], texels[y1, x1]])
+            visible[selected] = nearest[selected] <= farthest + self.depth_bias
+
+        self.tested += count
+        self.culled += int(count - np.count_nonzero(visible))
+        return visible
+
+    def cull(self, objects, bounds):
+        """Оставить видимые объекты; bounds - список AABB в том же порядке"""
+        if not objects:
+            return objects
+        mask = self.test_aabbs(bounds)
+        return [obj for obj, keep in zip(objects, mask) if keep]
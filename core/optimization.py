@@ -1,49 +1,244 @@
 from OpenGL.GL import *
 import numpy as np
 
+class Frustum:
+    """Усеченная пирамида видимости из шести плоскостей (a, b, c, d), нормали внутрь"""
+    OUTSIDE = 0
+    INTERSECT = 1
+    INSIDE = 2
+
+    def __init__(self, planes):
+        self.planes = [tuple(float(v) for v in plane) for plane in planes]
+
+    @classmethod
+    def from_matrices(cls, view, projection):
+        """Построить по матрицам вида и проекции (строчная запись, clip = P @ V @ p)"""
+        clip = np.asarray(projection, dtype=np.float64) @ np.asarray(view, dtype=np.float64)
+        rows = clip
+        planes = np.array([
+            rows[3] + rows[0],  # left
+            rows[3] - rows[0],  # right
+            rows[3] + rows[1],  # bottom
+            rows[3] - rows[1],  # top
+            rows[3] + rows[2],  # near
+            rows[3] - rows[2],  # far
+        ])
+        lengths = np.linalg.norm(planes[:, :3], axis=1)
+        planes /= np.maximum(lengths, 1e-12)[:, None]
+        return cls(planes)
+
+    @classmethod
+    def from_gl_matrices(cls, modelview, projection):
+        """Построить по матрицам из glGetFloatv (хранятся по столбцам)"""
+        return cls.from_matrices(np.asarray(modelview).reshape(4, 4).T,
+                                 np.asarray(projection).reshape(4, 4).T)
+
+    def classify_aabb(self, bounds):
+        """OUTSIDE, INTERSECT или INSIDE для [min_x, min_y, min_z, max_x, max_y, max_z]"""
+        cx = (bounds[0] + bounds[3]) * 0.5
+        cy = (bounds[1] + bounds[4]) * 0.5
+        cz = (bounds[2] + bounds[5]) * 0.5
+        ex = (bounds[3] - bounds[0]) * 0.5
+        ey = (bounds[4] - bounds[1]) * 0.5
+        ez = (bounds[5] - bounds[2]) * 0.5
+
+        result = self.INSIDE
+        for a, b, c, d in self.planes:
+            distance = a * cx + b * cy + c * cz + d
+            radius = abs(a) * ex + abs(b) * ey + abs(c) * ez
+            if distance < -radius:
+                return self.OUTSIDE
+            if distance < radius:
+                result = self.INTERSECT
+        return result
+
+    def intersects_aabb(self, bounds):
+        return self.classify_aabb(bounds) != self.OUTSIDE
+
+    def cull_aabbs(self, bounds_array):
+        """Векторная проверка N боксов формы (N, 6); возвращает маску видимых"""
+        bounds_array = np.asarray(bounds_array, dtype=np.float64)
+        centers = (bounds_array[:, :3] + bounds_array[:, 3:]) * 0.5
+        extents = (bounds_array[:, 3:] - bounds_array[:, :3]) * 0.5
+        planes = np.asarray(self.planes)
+        distances = centers @ planes[:, :3].T + planes[:, 3]
+        radii = extents @ np.abs(planes[:, :3]).T
+        return np.all(distances >= -radii, axis=1)
+
+class _OctreeState:
+    """Данные, общие для всех узлов одного дерева"""
+    __slots__ = ('locations', 'stamps', 'stamp', 'stack', 'inside_stack')
+
+    def __init__(self):
+        self.locations = {}  # obj -> узел
+        self.stamps = {}  # obj -> метка последнего запроса, вернувшего объект
+        self.stamp = 0
+        self.stack = []
+        self.inside_stack = []
+
 class Octree:
-    def __init__(self, bounds, max_depth=8, max_objects=10):
+    """Свободное (loose) октодерево.
+
+    Объект хранится в одном узле, чьи расширенные границы (loose_bounds) целиком
+    его содержат. Словарь locations, общий для всего дерева, хранит обратную ссылку
+    объект -> узел, поэтому небольшие перемещения обновляются без перевставки.
+    """
+
+    def __init__(self, bounds, max_depth=8, max_objects=10, looseness=2.0, parent=None):
         self.bounds = bounds  # [min_x, min_y, min_z, max_x, max_y, max_z]
         self.max_depth = max_depth
         self.max_objects = max_objects
-        self.objects = []
+        self.looseness = looseness
+        self.objects = {}  # obj -> bounds
         self.children = []
-        self.depth = 0
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self._state = parent._state if parent is not None else _OctreeState()
+        self.locations = self._state.locations
+
+        self.center = [(bounds[i] + bounds[i + 3]) / 2 for i in range(3)]
+        half = [(bounds[i + 3] - bounds[i]) / 2 * looseness for i in range(3)]
+        self.loose_bounds = [self.center[i] - half[i] for i in range(3)] + \
+                            [self.center[i] + half[i] for i in range(3)]
         
     def insert(self, obj, bounds):
-        if not self._intersects(bounds):
+        if not self._fits(bounds):
             return False
-            
-        if len(self.objects) < self.max_objects or self.depth >= self.max_depth:
-            self.objects.append((obj, bounds))
-            return True
-            
-        if not self.children:
-            self._subdivide()
-            
-        for child in self.children:
-            if child.insert(obj, bounds):
-                return True
-                
-        self.objects.append((obj, bounds))
+
+        node = self
+        while True:
+            if node.children:
+                child = node.children[node._child_index(bounds)]
+                if child._fits(bounds):
+                    node = child
+                    continue
+            elif len(node.objects) >= node.max_objects and node.depth < node.max_depth:
+                node._subdivide()
+                continue
+            break
+
+        node.objects[obj] = bounds
+        self.locations[obj] = node
         return True
+
+    def remove(self, obj):
+        node = self.locations.pop(obj, None)
+        if node is None:
+            return False
+        del node.objects[obj]
+        self._state.stamps.pop(obj, None)
+        node._collapse()
+        return True
+
+    def update(self, obj, bounds):
+        """Обновить границы объекта; перевставка только при выходе из свободной ячейки"""
+        node = self.locations.get(obj)
+        if node is None:
+            return self.insert(obj, bounds)
+
+        if node._fits(bounds):
+            node.objects[obj] = bounds
+            return True
+
+        del node.objects[obj]
+        del self.locations[obj]
+        ancestor = node.parent
+        while ancestor is not None and not ancestor._fits(bounds):
+            ancestor = ancestor.parent
+
+        # Сначала перевставка, потом чистка: _collapse мог бы отрезать поддерево,
+        # в котором лежит ancestor, и объект попал бы в отсоединенный узел
+        inserted = ancestor is not None and ancestor.insert(obj, bounds)
+        node._collapse()
+        return inserted
+
+    def __contains__(self, obj):
+        return obj in self.locations
         
-    def query(self, query_bounds):
-        results = []
-        if not self._intersects(query_bounds):
-            return results
-            
-        results.extend([obj for obj, _ in self.objects])
-        
-        for child in self.children:
-            results.extend(child.query(query_bounds))
-            
+    def begin_query(self):
+        """Новая метка запроса; одну метку можно передать в несколько запросов,
+        чтобы объединить их результаты без повторов"""
+        state = self._state
+        state.stamp += 1
+        return state.stamp
+
+    def query(self, query_bounds, results=None, stamp=None):
+        """Объекты, пересекающие query_bounds, дописываются в results.
+
+        Обход итеративный, через общий стек дерева, поэтому запросы к одному
+        дереву не должны выполняться из нескольких потоков одновременно.
+        """
+        if results is None:
+            results = []
+        state = self._state
+        if stamp is None:
+            stamp = self.begin_query()
+        stamps = state.stamps
+        stack = state.stack
+        stack.append(self)
+
+        while stack:
+            node = stack.pop()
+            if not _aabb_overlap(node.loose_bounds, query_bounds):
+                continue
+            for obj, bounds in node.objects.items():
+                if _aabb_overlap(bounds, query_bounds) and stamps.get(obj) != stamp:
+                    stamps[obj] = stamp
+                    results.append(obj)
+            stack.extend(node.children)
+
         return results
         
+    def query_frustum(self, frustum, results=None, stamp=None):
+        """Собрать объекты в results; узлы целиком внутри принимаются без проверок объектов"""
+        if results is None:
+            results = []
+        state = self._state
+        if stamp is None:
+            stamp = self.begin_query()
+        stamps = state.stamps
+        stack = state.stack
+        inside = state.inside_stack
+        stack.append(self)
+
+        while stack:
+            node = stack.pop()
+            classification = frustum.classify_aabb(node.loose_bounds)
+            if classification == Frustum.OUTSIDE:
+                continue
+            if classification == Frustum.INSIDE:
+                inside.append(node)
+                continue
+            for obj, bounds in node.objects.items():
+                if frustum.intersects_aabb(bounds) and stamps.get(obj) != stamp:
+                    stamps[obj] = stamp
+                    results.append(obj)
+            stack.extend(node.children)
+
+        while inside:
+            node = inside.pop()
+            for obj in node.objects:
+                if stamps.get(obj) != stamp:
+                    stamps[obj] = stamp
+                    results.append(obj)
+            inside.extend(node.children)
+
+        return results
+
+    def _child_index(self, bounds):
+        # Дочерний узел выбирается по центру объекта
+        cx, cy, cz = self.center
+        index = 0
+        if bounds[0] + bounds[3] >= 2 * cx:
+            index |= 1
+        if bounds[1] + bounds[4] >= 2 * cy:
+            index |= 2
+        if bounds[2] + bounds[5] >= 2 * cz:
+            index |= 4
+        return index
+
     def _subdivide(self):
-        cx = (self.bounds[0] + self.bounds[3]) / 2
-        cy = (self.bounds[1] + self.bounds[4]) / 2
-        cz = (self.bounds[2] + self.bounds[5]) / 2
+        cx, cy, cz = self.center
         
         # Create 8 children
         for i in range(8):
@@ -56,29 +251,93 @@ class Octree:
                 cz if (i // 4) % 2 == 0 else self.bounds[5]
             ]
             
-            child = Octree(child_bounds, self.max_depth, self.max_objects)
-            child.depth = self.depth + 1
-            self.children.append(child)
+            self.children.append(Octree(child_bounds, self.max_depth, self.max_objects,
+                                        self.looseness, parent=self))
+
+        # Переносим вниз объекты, которые помещаются в дочерние ячейки
+        for obj, bounds in list(self.objects.items()):
+            child = self.children[self._child_index(bounds)]
+            if child._fits(bounds):
+                del self.objects[obj]
+                child.objects[obj] = bounds
+                self.locations[obj] = child
+
+    def _collapse(self):
+        """Удалить опустевшие поддеревья вверх по цепочке родителей"""
+        node = self.parent
+        while node is not None and not node.objects:
+            if any(child.objects or child.children for child in node.children):
+                break
+            node.children = []
+            node = node.parent
+
+    def _fits(self, bounds):
+        loose = self.loose_bounds
+        return (bounds[0] >= loose[0] and bounds[1] >= loose[1] and bounds[2] >= loose[2] and
+                bounds[3] <= loose[3] and bounds[4] <= loose[4] and bounds[5] <= loose[5])
             
     def _intersects(self, bounds):
-        return not (bounds[3] < self.bounds[0] or bounds[0] > self.bounds[3] or
-                   bounds[4] < self.bounds[1] or bounds[1] > self.bounds[4] or
-                   bounds[5] < self.bounds[2] or bounds[2] > self.bounds[5])
+        return _aabb_overlap(self.loose_bounds, bounds)
+
+def _aabb_overlap(a, b):
+    return not (b[3] < a[0] or b[0] > a[3] or
+                b[4] < a[1] or b[1] > a[4] or
+                b[5] < a[2] or b[2] > a[5])
 
 class SpatialPartitioning:
     def __init__(self):
         self.octree = None
         self.object_bounds = {}
+        self.outside_objects = {}  # Объекты за пределами корня октодерева
         
     def initialize(self, scene_bounds):
         self.octree = Octree(scene_bounds)
+        self.object_bounds = {}
+        self.outside_objects = {}
         
     def add_object(self, obj, bounds):
         self.object_bounds[obj] = bounds
+        if self.octree and not self.octree.insert(obj, bounds):
+            self.outside_objects[obj] = None
+
+    def remove_object(self, obj):
+        self.object_bounds.pop(obj, None)
+        self.outside_objects.pop(obj, None)
         if self.octree:
-            self.octree.insert(obj, bounds)
+            self.octree.remove(obj)
+
+    def update_object(self, obj, bounds):
+        """Обновить положение движущегося объекта в индексе.
+
+        Возвращает True, если объект сменил ячейку (сдвинулся сильно).
+        """
+        self.object_bounds[obj] = bounds
+        if not self.octree:
+            return False
+        if obj in self.outside_objects:
+            if self.octree.insert(obj, bounds):
+                del self.outside_objects[obj]
+                return True
+            return False
+        node = self.octree.locations.get(obj)
+        if not self.octree.update(obj, bounds):
+            self.outside_objects[obj] = None
+            return True
+        return self.octree.locations.get(obj) is not node
+
+    def clear(self):
+        if self.octree:
+            self.initialize(self.octree.bounds)
+        self.object_bounds = {}
+        self.outside_objects = {}
             
-    def get_visible_objects(self, frustum):
+    def get_visible_objects(self, frustum, results=None):
+        if results is None:
+            results = []
         if not self.octree:
-            return []
-        return self.octree.query(frustum.get_bounds())
\ No newline at end of file
+            return results
+        visible = self.octree.query_frustum(frustum, results)
+        for obj in self.outside_objects:
+            if frustum.intersects_aabb(self.object_bounds[obj]):
+                visible.append(obj)
+        return visible
@@ -48,6 +48,13 @@ def import_optimization():
     except ImportError:
         return None
 
+def import_occlusion():
+    try:
+        from .occlusion import OcclusionCuller
+        return OcclusionCuller
+    except ImportError:
+        return None
+
 def import_pbr_material():
     try:
         from .pbr_material import PBRMaterial
@@ -71,18 +78,21 @@ class Scene:
         self.prefab_manager = PrefabManager()
         
         # Ленивая инициализация систем
-        self.script_engine, self.MonoBehaviour, self.Time, self.Vector3 = import_scripting()
+        ScriptEngine, self.MonoBehaviour, self.Time, self.Vector3 = import_scripting()
+        self.script_engine = ScriptEngine() if ScriptEngine else None
         self.PostProcessingStack = import_post_processing()
         self.LODSystem = import_lod_system()
         self.AssetManager = import_asset_manager()
         self.SpatialPartitioning = import_optimization()
         self.PBRMaterial = import_pbr_material()
+        self.OcclusionCuller = import_occlusion()
         
         # Инициализация систем
         self.post_processing = self.PostProcessingStack() if self.PostProcessingStack else None
         self.lod_system = self.LODSystem() if self.LODSystem else None
         self.asset_manager = self.AssetManager() if self.AssetManager else None
         self.spatial_partitioning = self.SpatialPartitioning() if self.SpatialPartitioning else None
+        self.occlusion_culler = self.OcclusionCuller() if self.OcclusionCuller else None
         
         # PBR материалы
         self.pbr_materials: Dict[str, Any] = {}
@@ -99,6 +109,13 @@ class Scene:
         self.play_time = 0.0
         self.delta_time = 0.0
         self.use_optimization = True
+        self._visible_objects = []
+        self.use_occlusion_culling = True
+        self.camera_view_matrix = None
+        self.camera_projection_matrix = None
+        self.terrain = None  # Назначается TerrainPlugin
+        self.script_watcher = None  # Горячая перезагрузка скриптов, см. watch_scripts
+        self._play_snapshot = None  # Состояние объектов на момент play(), восстанавливается в stop()
         self._last_update_time = time.time()
         
         # Инициализация
@@ -197,6 +214,10 @@ class Scene:
         else:
             self.delta_time = dt
         
+        # Горячая перезагрузка работает и в режиме редактирования, и в режиме игры
+        if self.script_watcher:
+            self.script_watcher.poll()
+        
         if self.is_playing:
             self.play_time += self.delta_time
             
@@ -213,13 +234,19 @@ class Scene:
             # Обрабатываем коллизии для скриптов
             self.handle_script_collisions()
         
+        # Переносим сдвинувшиеся объекты в пространственном разбиении
+        self.update_spatial_partitioning()
+        
         # Всегда обновляем системы частиц
         for ps in self.particle_systems:
             ps.update(self.delta_time)
             
         # Обновляем LOD систему
         if self.lod_system and hasattr(self, 'camera_position'):
-            self.lod_system.update_lod(self.camera_position, self.objects)
+            projection_scale = None
+            if self.camera_projection_matrix is not None:
+                projection_scale = self.camera_projection_matrix[1][1]
+            self.lod_system.update_lod(self.camera_position, projection_scale)
             
         # Обновляем время для скриптов
         if self.Time:
@@ -266,19 +293,57 @@ class Scene:
         for obj in visible_objects:
             obj.draw()
         
+        self.draw_terrain()
+        
         # Отрисовка систем частиц
         for ps in self.particle_systems:
             ps.draw()
 
-    def get_visible_objects(self):
-        """Получить видимые объекты"""
-        if not self.use_optimization or not hasattr(self, 'camera_position'):
+    def draw_terrain(self, viewport_height=720.0):
+        """Отрисовать террейн с отсечением и LOD чанков по камере кадра"""
+        if self.terrain is None:
+            return
+        projection_scale = None
+        if self.camera_projection_matrix is not None:
+            projection_scale = self.camera_projection_matrix[1][1]
+        frustum = getattr(self, 'camera_frustum', None) if self.use_optimization else None
+        self.terrain.draw(getattr(self, 'camera_position', None), frustum, projection_scale, viewport_height)
+
+    def set_camera(self, position, view_matrix, projection_matrix):
+        """Задать камеру кадра (матрицы в строчной записи) для отсечения"""
+        from .optimization import Frustum
+        
+        self.camera_position = position
+        self.camera_view_matrix = view_matrix
+        self.camera_projection_matrix = projection_matrix
+        self.camera_frustum = Frustum.from_matrices(view_matrix, projection_matrix)
+
+    def get_visible_objects(self, frustum=None):
+        """Получить видимые объекты (отсечение по пирамиде видимости и перекрытию)"""
+        if frustum is None:
+            frustum = getattr(self, 'camera_frustum', None)
+        if not self.use_optimization or frustum is None:
             return self.objects
             
-        if self.spatial_partitioning:
-            return self.spatial_partitioning.get_visible_objects(self.camera_position)
+        if self.spatial_partitioning and self.spatial_partitioning.octree:
+            # Буфер результатов переиспользуется между кадрами
+            self._visible_objects.clear()
+            visible = self.spatial_partitioning.get_visible_objects(frustum, self._visible_objects)
+        else:
+            visible = self.objects
+            
+        if self.use_occlusion_culling and self.occlusion_culler and self.camera_view_matrix is not None:
+            visible = self._apply_occlusion_culling(visible)
         
-        return self.objects
+        return visible
+
+    def _apply_occlusion_culling(self, visible):
+        """Отсечь объекты, перекрытые крупными окклюдерами"""
+        culler = self.occlusion_culler
+        culler.begin_frame(self.camera_view_matrix, self.camera_projection_matrix, self.camera_position)
+        culler.render_occluders([bounds for bounds in map(self._calculate_occluder_bounds, visible)
+                                 if bounds is not None])
+        return culler.cull(visible, [self._calculate_object_bounds(obj) for obj in visible])
 
     def play(self):
         """Запустить воспроизведение сцены"""
@@ -286,6 +351,11 @@ class Scene:
         self.play_time = 0.0
         self._last_update_time = time.time()
         
+        # Запоминаем исходное состояние (после паузы оно уже сохранено)
+        if self._play_snapshot is None:
+            self._play_snapshot = [(obj, obj.position[:], obj.rotation[:], obj.scale[:])
+                                   for obj in self.objects]
+        
         # Запускаем анимации
         self.animations.play_all()
         
@@ -313,8 +383,34 @@ class Scene:
         self.animations.stop_all()
         self.stop_scripts()
         
-        # Восстанавливаем исходное состояние
-        self.create_default_scene()
+        # Восстанавливаем исходное состояние объектов, не пересоздавая сцену:
+        # скрипты и их классы (в том числе перезагруженные) остаются на месте
+        if self._play_snapshot is not None:
+            initial_objects = [obj for obj, _, _, _ in self._play_snapshot]
+            initial_ids = {id(obj) for obj in initial_objects}
+            
+            # Созданные во время игры объекты убираем вместе с их скриптами
+            for obj in [obj for obj in self.objects if id(obj) not in initial_ids]:
+                self.remove_object(obj)
+            
+            # Уничтоженные во время игры возвращаем тем же путем, что и при добавлении
+            present_ids = {id(obj) for obj in self.objects}
+            for obj in initial_objects:
+                if id(obj) not in present_ids:
+                    self.add_object(obj)
+                    for script in getattr(obj, 'scripts', []):
+                        script._started = False
+            self.objects[:] = initial_objects
+            
+            for obj, position, rotation, scale in self._play_snapshot:
+                obj.position[:] = position
+                obj.rotation[:] = rotation
+                obj.scale[:] = scale
+                if hasattr(obj, 'rigidbody') and obj.rigidbody:
+                    obj.rigidbody.velocity = [0, 0, 0]
+                    obj.rigidbody.angular_velocity = [0, 0, 0]
+            self._play_snapshot = None
+        self.optimize_scene()
         print(f"Scene '{self.name}' stopped")
 
     def start_scripts(self):
@@ -365,6 +461,9 @@ class Scene:
             if self.spatial_partitioning:
                 self.spatial_partitioning.remove_object(obj)
                 
+            if self.lod_system:
+                self.lod_system.remove_object(obj)
+                
             # Убираем скрипты объекта
             if self.script_engine and hasattr(obj, 'scripts'):
                 for script in obj.scripts:
@@ -390,6 +489,9 @@ class Scene:
         # Очищаем пространственное разбиение
         if self.spatial_partitioning:
             self.spatial_partitioning.clear()
+            
+        if self.lod_system:
+            self.lod_system.clear()
 
     # Системы частиц
     def create_particle_system(self, position=(0, 0, 0)):
@@ -416,11 +518,27 @@ class Scene:
         if not self.script_engine:
             return False
             
-        success = self.script_engine.load_script_from_file(obj, script_path)
-        if success:
-            print(f"Loaded script from {script_path} to {obj.name}")
-            return True
-        return False
+        # Повторная загрузка того же файла берет класс из кэша движка
+        script_class = self.script_engine.load_script_from_file(script_path)
+        if script_class is None:
+            return False
+        
+        script = script_class()
+        obj._scene = self
+        obj.scripts.append(script)
+        script._set_game_object(obj)
+        self.script_engine.register_script(script)
+        print(f"Loaded script from {script_path} to {obj.name}")
+        return True
+
+    def watch_scripts(self, directory: Optional[str], interval: float = 0.5):
+        """Включить горячую перезагрузку скриптов из папки (None - выключить)"""
+        if not self.script_engine or not directory:
+            self.script_watcher = None
+            return None
+        from .script_reload import ScriptWatcher
+        self.script_watcher = ScriptWatcher(self.script_engine, directory, interval)
+        return self.script_watcher
 
     def get_script_components(self, obj):
         """Получить все компоненты скриптов объекта"""
@@ -443,6 +561,18 @@ class Scene:
             bounds = self._calculate_object_bounds(obj)
             self.spatial_partitioning.add_object(obj, bounds)
 
+    def update_spatial_partitioning(self):
+        """Обновить границы нестатических объектов в пространственном разбиении"""
+        if not self.use_optimization or not self.spatial_partitioning or not self.spatial_partitioning.octree:
+            return
+            
+        for obj in self.objects:
+            if not getattr(obj, 'static', False):
+                rebinned = self.spatial_partitioning.update_object(obj, self._calculate_object_bounds(obj))
+                # Сменившие ячейку объекты в первую очередь получают пересчет LOD
+                if rebinned and self.lod_system:
+                    self.lod_system.mark_moved(obj)
+
     def _calculate_scene_bounds(self):
         """Рассчитать границы сцены"""
         if not self.objects:
@@ -471,6 +601,24 @@ class Scene:
             obj.position[0] + size, obj.position[1] + size, obj.position[2] + size
         ]
 
+    def _calculate_occluder_bounds(self, obj):
+        """Консервативный бокс окклюдера: только неповернутые кубы, иначе None.
+
+        Бокс обрезается по границам объекта из _calculate_object_bounds: иначе
+        окклюдер, выступающий за бокс проверки, перекрывает сам себя.
+        """
+        from .objects import GameObject
+        
+        if getattr(obj, 'primitive_type', None) != GameObject.PRIMITIVE_CUBE or any(obj.rotation):
+            return None
+        if not getattr(obj, 'visible', True):
+            return None
+            
+        half = [s / 2 for s in obj.scale]
+        test_bounds = self._calculate_object_bounds(obj)
+        return [max(obj.position[i] - half[i], test_bounds[i]) for i in range(3)] + \
+               [min(obj.position[i] + half[i], test_bounds[i + 3]) for i in range(3)]
+
     # Сериализация
     def save_to_file(self, filename: str) -> bool:
         """Сохранить сцену в файл"""
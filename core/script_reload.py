@@ -0,0 +1,62 @@
+import os
+import time
+
+class ScriptWatcher:
+    """Следит за папкой скриптов и перезагружает измененные файлы в ScriptEngine.
+
+    Изменения ищутся опросом mtime и размера не чаще раза в interval секунд, поэтому
+    poll можно вызывать каждый кадр. Перезагружаются только файлы, классы из которых
+    уже загружены движком; новые файлы просто запоминаются до первой загрузки.
+    """
+
+    def __init__(self, engine, directory, interval=0.5):
+        self.engine = engine
+        self.directory = os.path.abspath(directory)
+        self.interval = interval
+        self.on_reload = None  # callback(путь, число обновленных скриптов)
+        self.on_error = None  # callback(путь) - новая версия не загрузилась
+        self._snapshot = self._scan()
+        self._next_poll = 0.0
+
+    def _scan(self):
+        snapshot = {}
+        for root, folders, files in os.walk(self.directory):
+            folders[:] = [folder for folder in folders if folder != '__pycache__']
+            for name in files:
+                if not name.endswith('.py'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Файл удален или пересохраняется прямо сейчас
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, now=None):
+        """Проверить папку, если с прошлой проверки прошло interval секунд"""
+        now = time.monotonic() if now is None else now
+        if now < self._next_poll:
+            return []
+        self._next_poll = now + self.interval
+        return self.check()
+
+    def check(self):
+        """Перезагрузить загруженные скрипты, изменившиеся с прошлой проверки; возвращает их пути"""
+        snapshot = self._scan()
+        changed = [path for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        self._snapshot = snapshot
+
+        reloaded = []
+        for path in changed:
+            if not self.engine.is_script_loaded(path):
+                continue
+            count = self.engine.reload_script(path)
+            if count is None:
+                if self.on_error:
+                    self.on_error(path)
+                continue
+            reloaded.append(path)
+            if self.on_reload:
+                self.on_reload(path, count)
+        return reloaded
@@ -1,10 +1,19 @@
 import os
 import sys
 import importlib.util
+import bisect
+import copy
+import hashlib
+import heapq
+import marshal
+import math
+import struct
 import inspect
 import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Any, Callable, Type
 from enum import Enum
+import numpy as np
 
 class ExecutionOrder(Enum):
     """Порядок выполнения скриптов, как в Unity"""
@@ -17,33 +26,32 @@ class ExecutionOrder(Enum):
     ON_DISABLE = 900
     ON_DESTROY = 1000
 
+def _order_value(order) -> int:
+    return order.value if isinstance(order, ExecutionOrder) else int(order)
+
+def execution_order(order):
+    """Декоратор класса скрипта: порядок выполнения (int или ExecutionOrder), меньше - раньше"""
+    def decorate(cls):
+        cls.execution_order = _order_value(order)
+        _script_class_cache.clear()
+        return cls
+    return decorate
+
 class MonoBehaviour:
     """Базовый класс для всех скриптов, аналог MonoBehaviour из Unity"""
     
+    # Порядок выполнения класса, как Script Execution Order в Unity. Скрипты с равным
+    # порядком вызываются в порядке регистрации. Задается атрибутом или @execution_order
+    execution_order = 0
+    
     def __init__(self):
         self.gameObject = None
         self.transform = None
         self.enabled = True
         self._started = False
-        self._execution_order = 0
-        
-        # Автоматически определяем порядок выполнения
-        self._determine_execution_order()
-    
-    def _determine_execution_order(self):
-        """Определяем порядок выполнения на основе методов"""
-        if hasattr(self, 'Awake'):
-            self._execution_order = ExecutionOrder.AWAKE.value
-        elif hasattr(self, 'OnEnable'):
-            self._execution_order = ExecutionOrder.ON_ENABLE.value
-        elif hasattr(self, 'Start'):
-            self._execution_order = ExecutionOrder.START.value
-        elif hasattr(self, 'FixedUpdate'):
-            self._execution_order = ExecutionOrder.FIXED_UPDATE.value
-        elif hasattr(self, 'Update'):
-            self._execution_order = ExecutionOrder.UPDATE.value
-        elif hasattr(self, 'LateUpdate'):
-            self._execution_order = ExecutionOrder.LATE_UPDATE.value
+        self._dispatch_key = None  # Ключ в таблицах ScriptEngine, пока скрипт зарегистрирован
+        self._engine = None  # ScriptEngine, в котором зарегистрирован скрипт
+        self._coroutines = set()  # Активные корутины скрипта
     
     def _set_game_object(self, game_object):
         """Установить ссылку на игровой объект (вызывается системой)"""
@@ -167,6 +175,23 @@ class MonoBehaviour:
         
         return component
     
+    def StartCoroutine(self, routine) -> Optional['Coroutine']:
+        """Запустить корутину (генератор); первый шаг выполняется сразу"""
+        if self._engine is None:
+            print(f"Coroutine couldn't be started: {self.__class__.__name__} is not registered")
+            return None
+        return self._engine.start_coroutine(self, routine)
+    
+    def StopCoroutine(self, coroutine: 'Coroutine'):
+        """Остановить корутину, запущенную StartCoroutine"""
+        if self._engine is not None and coroutine is not None:
+            self._engine.stop_coroutine(coroutine)
+    
+    def StopAllCoroutines(self):
+        """Остановить все корутины скрипта"""
+        if self._engine is not None:
+            self._engine.stop_coroutines(self)
+    
     def Instantiate(self, original, position=None, rotation=None):
         """Создать копию объекта"""
         # Заглушка - в реальной реализации нужно клонировать объект
@@ -207,6 +232,225 @@ class MonoBehaviour:
         
         return objects
 
+# Методы жизненного цикла, вызываемые движком через таблицы диспетчеризации
+DISPATCH_METHODS = ('Awake', 'OnEnable', 'Start', 'FixedUpdate', 'Update', 'LateUpdate',
+                    'OnDisable', 'OnDestroy')
+
+class _ScriptClassInfo:
+    """Сведения о классе скрипта: порядок выполнения и переопределенные методы"""
+    __slots__ = ('order', 'methods')
+    
+    def __init__(self, order: int, methods: Dict[str, bool]):
+        self.order = order
+        self.methods = methods  # Имя метода -> принимает ли delta_time
+
+_script_class_cache: Dict[type, _ScriptClassInfo] = {}
+
+def _script_class_info(cls) -> _ScriptClassInfo:
+    """Считается один раз на класс; методы-заглушки MonoBehaviour в таблицы не попадают"""
+    info = _script_class_cache.get(cls)
+    if info is None:
+        methods = {}
+        for name in DISPATCH_METHODS:
+            function = getattr(cls, name, None)
+            if function is None or function is getattr(MonoBehaviour, name):
+                continue
+            try:
+                parameters = list(inspect.signature(function).parameters.values())[1:]
+                takes_delta = bool(parameters) or any(
+                    p.kind == inspect.Parameter.VAR_POSITIONAL for p in parameters)
+            except (TypeError, ValueError):
+                takes_delta = False
+            methods[name] = takes_delta
+        info = _ScriptClassInfo(_order_value(getattr(cls, 'execution_order', 0)), methods)
+        _script_class_cache[cls] = info
+    return info
+
+# ========== КОРУТИНЫ ==========
+
+class YieldInstruction:
+    """Базовый класс инструкций ожидания для yield в корутинах"""
+    __slots__ = ()
+
+class WaitForSeconds(YieldInstruction):
+    """Продолжить корутину через seconds секунд времени скриптов"""
+    __slots__ = ('seconds',)
+    
+    def __init__(self, seconds: float):
+        self.seconds = float(seconds)
+
+class WaitForFixedUpdate(YieldInstruction):
+    """Продолжить корутину после следующего шага FixedUpdate"""
+    __slots__ = ()
+
+class WaitUntil(YieldInstruction):
+    """Продолжить корутину, когда predicate() вернет True (проверяется каждый кадр)"""
+    __slots__ = ('predicate',)
+    
+    def __init__(self, predicate: Callable[[], bool]):
+        self.predicate = predicate
+
+class Coroutine:
+    """Запущенная корутина; ее можно передать в StopCoroutine или вернуть из yield другой корутины"""
+    __slots__ = ('routine', 'owner', 'name', 'done', 'waiting', '_waiters')
+    
+    def __init__(self, routine, owner: MonoBehaviour):
+        self.routine = routine
+        self.owner = owner
+        self.name = f"{getattr(routine, '__name__', 'coroutine')} (coroutine)"
+        self.done = False
+        self.waiting = None  # Текущая инструкция ожидания
+        self._waiters: List['Coroutine'] = []  # Корутины, ждущие завершения этой
+
+class ScriptProfiler:
+    """Профилировщик скриптов: число вызовов, суммарное и максимальное время по (класс, метод).
+
+    Выключен по умолчанию; пока выключен, ScriptEngine вызывает методы обычным циклом
+    без замеров. В конце кадра время каждого скрипта сравнивается с frame_budget_ms,
+    превышение сообщается через on_warning не чаще раза в warning_interval секунд на класс.
+    """
+    
+    SORT_COLUMNS = {'calls': 2, 'total': 3, 'average': 4, 'max': 5}
+    
+    def __init__(self, frame_budget_ms: float = 2.0, warning_interval: float = 5.0):
+        self.enabled = False
+        self.frame_budget_ms = frame_budget_ms
+        self.warning_interval = warning_interval
+        self.on_warning: Callable[[str], None] = print
+        self.stats: Dict[tuple, List[int]] = {}  # (класс, метод) -> [вызовы, сумма нс, максимум нс]
+        self._frame_ns: Dict[int, list] = {}  # id скрипта -> [скрипт, нс за текущий кадр]
+        self._last_warning: Dict[type, float] = {}
+    
+    def record(self, script: MonoBehaviour, method_name: str, elapsed_ns: int):
+        """Учесть один вызов метода скрипта"""
+        key = (type(script), method_name)
+        stat = self.stats.get(key)
+        if stat is None:
+            self.stats[key] = [1, elapsed_ns, elapsed_ns]
+        else:
+            stat[0] += 1
+            stat[1] += elapsed_ns
+            if elapsed_ns > stat[2]:
+                stat[2] = elapsed_ns
+        
+        frame = self._frame_ns.get(id(script))
+        if frame is None:
+            self._frame_ns[id(script)] = [script, elapsed_ns]
+        else:
+            frame[1] += elapsed_ns
+    
+    def end_frame(self):
+        """Проверить бюджет кадра и начать учет следующего кадра"""
+        frame, self._frame_ns = self._frame_ns, {}
+        if self.frame_budget_ms <= 0:
+            return
+        budget_ns = self.frame_budget_ms * 1e6
+        now = time.perf_counter()
+        for script, elapsed_ns in frame.values():
+            if elapsed_ns <= budget_ns:
+                continue
+            script_class = type(script)
+            last = self._last_warning.get(script_class)
+            if last is not None and now - last < self.warning_interval:
+                continue
+            self._last_warning[script_class] = now
+            owner = getattr(script.gameObject, 'name', None) or "<no object>"
+            self.on_warning(f"Script {script_class.__name__} on '{owner}' took "
+                            f"{elapsed_ns / 1e6:.2f} ms this frame "
+                            f"(budget {self.frame_budget_ms:.2f} ms)")
+    
+    def top(self, count: int = 10, sort_by: str = 'total') -> List[tuple]:
+        """Самые дорогие методы: [(класс, метод, вызовы, сумма мс, среднее мкс, максимум мс)]"""
+        rows = [(script_class.__name__, method_name, calls, total_ns / 1e6,
+                 total_ns / calls / 1e3, max_ns / 1e6)
+                for (script_class, method_name), (calls, total_ns, max_ns) in self.stats.items()]
+        column = self.SORT_COLUMNS.get(sort_by, 3)
+        rows.sort(key=lambda row: row[column], reverse=True)
+        return rows[:count]
+    
+    def reset(self):
+        """Сбросить накопленную статистику"""
+        self.stats = {}
+        self._frame_ns = {}
+        self._last_warning = {}
+
+# ========== КЭШ СКОМПИЛИРОВАННЫХ СКРИПТОВ ==========
+
+# Импорты Unity-like API, выполняемые в модуле скрипта перед его кодом. Компилируются
+# отдельно, чтобы номера строк в ошибках совпадали с файлом скрипта
+_SCRIPT_PRELUDE = compile(
+    "from core.scripting import MonoBehaviour, Time, Input, Debug, Mathf, Vector3, Quaternion, Vector3Array\n"
+    "from core.scripting import WaitForSeconds, WaitForFixedUpdate, WaitUntil\n"
+    "import math\n",
+    "<script prelude>", "exec")
+
+# Заголовок файла кэша: магия интерпретатора и формата, mtime_ns и размер исходника, SHA-256 исходника
+_SCRIPT_CACHE_MAGIC = importlib.util.MAGIC_NUMBER + b'SCR1'
+_SCRIPT_CACHE_HEADER = struct.Struct('<qq32s')
+
+def script_cache_path(file_path: str) -> str:
+    """Путь к байткоду скрипта в __pycache__ рядом с ним"""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    tag = sys.implementation.cache_tag or 'py'
+    return os.path.join(directory, '__pycache__', f"{os.path.splitext(name)[0]}.{tag}.script.pyc")
+
+def compile_script(file_path: str):
+    """Код скрипта из кэша байткода или свежей компиляции (с обновлением кэша).
+
+    Кэш действителен, если совпадают mtime и размер файла. Если они изменились, а
+    хэш содержимого тот же (файл пересохранен без правок), код берется из кэша и
+    переписывается только заголовок.
+    """
+    stat = os.stat(file_path)
+    cache_path = script_cache_path(file_path)
+    prefix = len(_SCRIPT_CACHE_MAGIC)
+    header_end = prefix + _SCRIPT_CACHE_HEADER.size
+    
+    cached = None
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        if data[:prefix] == _SCRIPT_CACHE_MAGIC and len(data) >= header_end:
+            cached = _SCRIPT_CACHE_HEADER.unpack(data[prefix:header_end]), data[header_end:]
+    except OSError:
+        pass
+    
+    if cached is not None:
+        (mtime_ns, size, _), payload = cached
+        if mtime_ns == stat.st_mtime_ns and size == stat.st_size:
+            return marshal.loads(payload)
+    
+    with open(file_path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source).digest()
+    if cached is not None and cached[0][2] == digest:
+        payload = cached[1]
+        code = marshal.loads(payload)
+    else:
+        code = compile(source, file_path, 'exec', dont_inherit=True)
+        payload = marshal.dumps(code)
+    
+    # Запись через временный файл: параллельная загрузка не увидит половину кэша
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(_SCRIPT_CACHE_MAGIC)
+            f.write(_SCRIPT_CACHE_HEADER.pack(stat.st_mtime_ns, stat.st_size, digest))
+            f.write(payload)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # Папка только для чтения - работаем без кэша
+    return code
+
+def _precompile_script(file_path: str) -> Optional[str]:
+    """Задача пула предкомпиляции: None при успехе, иначе текст ошибки"""
+    try:
+        compile_script(file_path)
+        return None
+    except (OSError, SyntaxError, ValueError) as e:
+        return str(e)
+
 class ScriptEngine:
     """Движок выполнения скриптов, аналог Unity Scripting Engine"""
     
@@ -214,49 +458,270 @@ class ScriptEngine:
         self.scripts: List[MonoBehaviour] = []
         self.fixed_time_step = 0.02  # 50 FPS для FixedUpdate
         self._fixed_time_accumulator = 0.0
-        self._execution_groups: Dict[int, List[MonoBehaviour]] = {}
+        
+        # Таблицы диспетчеризации: метод -> [(ключ порядка, скрипт, связанный метод, передавать dt)],
+        # отсортированные при регистрации; ключ (порядок, номер регистрации) уникален
+        self._dispatch: Dict[str, List[tuple]] = {name: [] for name in DISPATCH_METHODS}
+        self._dispatch_keys: Dict[str, List[tuple]] = {name: [] for name in DISPATCH_METHODS}
+        self._registration_counter = 0
+        
+        # Планировщик корутин. Ждущие WaitForSeconds лежат в куче по времени пробуждения,
+        # поэтому за кадр просматриваются только те, чей срок наступил
+        self.time = 0.0
+        self._frame_index = 0
+        self._coroutine_heap: List[tuple] = []  # (время пробуждения, номер, кадр постановки, корутина)
+        self._coroutine_counter = 0
+        self._next_frame_coroutines: List[Coroutine] = []  # yield None
+        self._fixed_update_coroutines: List[Coroutine] = []  # yield WaitForFixedUpdate()
+        self._wait_until_coroutines: List[Coroutine] = []  # yield WaitUntil(...)
+        
+        # Загруженные классы скриптов: абсолютный путь -> (mtime_ns, размер, класс)
+        self._script_classes: Dict[str, tuple] = {}
+        
+        # Профилирование включается явно: profiler.enabled = True
+        self.profiler = ScriptProfiler()
         
         # Глобальные переменные, аналог Unity API
         self.globals = {
-            'Time': Time(),
-            'Input': Input(),
-            'Debug': Debug(),
-            'Mathf': Mathf(),
+            'Time': _time,
+            'Input': _input,
+            'Debug': _debug,
+            'Mathf': _mathf,
             'Vector3': Vector3,
             'Quaternion': Quaternion,
+            'Vector3Array': Vector3Array,
+            'WaitForSeconds': WaitForSeconds,
+            'WaitForFixedUpdate': WaitForFixedUpdate,
+            'WaitUntil': WaitUntil,
         }
     
     def register_script(self, script: MonoBehaviour):
         """Зарегистрировать скрипт для выполнения"""
+        if getattr(script, '_dispatch_key', None) is not None:
+            return
         self.scripts.append(script)
-        
-        # Группируем по порядку выполнения
-        if script._execution_order not in self._execution_groups:
-            self._execution_groups[script._execution_order] = []
-        self._execution_groups[script._execution_order].append(script)
+        script._engine = self
+        script._dispatch_key = (_script_class_info(type(script)).order, self._registration_counter)
+        self._registration_counter += 1
+        self._add_to_dispatch(script)
+    
+    def set_execution_order(self, script_class: type, order):
+        """Изменить порядок класса и переставить только его скрипты (номер регистрации сохраняется)"""
+        script_class.execution_order = _order_value(order)
+        _script_class_cache.clear()
+        for script in self.scripts:
+            if isinstance(script, script_class):
+                self._remove_from_dispatch(script)
+                script._dispatch_key = (_script_class_info(type(script)).order, script._dispatch_key[1])
+                self._add_to_dispatch(script)
+    
+    def _add_to_dispatch(self, script: MonoBehaviour):
+        key = script._dispatch_key
+        for name, takes_delta in _script_class_info(type(script)).methods.items():
+            keys = self._dispatch_keys[name]
+            index = bisect.bisect_right(keys, key)
+            keys.insert(index, key)
+            self._dispatch[name].insert(index, (key, script, getattr(script, name), takes_delta))
+    
+    def _remove_from_dispatch(self, script: MonoBehaviour):
+        key = script._dispatch_key
+        for name in _script_class_info(type(script)).methods:
+            keys = self._dispatch_keys[name]
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+                del self._dispatch[name][index]
     
     def unregister_script(self, script: MonoBehaviour):
         """Убрать скрипт из выполнения"""
-        if script in self.scripts:
-            self.scripts.remove(script)
-            if script._execution_order in self._execution_groups:
-                self._execution_groups[script._execution_order].remove(script)
+        if getattr(script, '_dispatch_key', None) is None:
+            return
+        self._remove_from_dispatch(script)
+        self.stop_coroutines(script)
+        script._dispatch_key = None
+        script._engine = None
+        self.scripts.remove(script)
+    
+    def clear(self):
+        """Убрать все скрипты"""
+        for script in self.scripts:
+            for coroutine in script._coroutines:
+                coroutine.done = True
+            script._coroutines.clear()
+            script._dispatch_key = None
+            script._engine = None
+        self.scripts = []
+        for name in DISPATCH_METHODS:
+            self._dispatch[name] = []
+            self._dispatch_keys[name] = []
+        self._coroutine_heap = []
+        self._next_frame_coroutines = []
+        self._fixed_update_coroutines = []
+        self._wait_until_coroutines = []
+    
+    # ========== КОРУТИНЫ ==========
+    
+    def start_coroutine(self, owner: MonoBehaviour, routine) -> Optional[Coroutine]:
+        """Запустить генератор как корутину скрипта owner и выполнить его до первого yield"""
+        if not inspect.isgenerator(routine):
+            print(f"Error in {owner.__class__.__name__}.StartCoroutine: expected a generator, "
+                  f"got {type(routine).__name__}")
+            return None
+        coroutine = Coroutine(routine, owner)
+        owner._coroutines.add(coroutine)
+        self._step_coroutine(coroutine)
+        return coroutine
+    
+    def stop_coroutine(self, coroutine: Coroutine):
+        """Остановить корутину; записи в очередях удаляются лениво при пробуждении"""
+        if coroutine.done:
+            return
+        try:
+            coroutine.routine.close()
+        except ValueError:
+            pass  # Корутина останавливает сама себя: генератор закроется после выхода из next
+        self._finish_coroutine(coroutine)
+    
+    def stop_coroutines(self, owner: MonoBehaviour):
+        """Остановить все корутины скрипта"""
+        for coroutine in tuple(owner._coroutines):
+            self.stop_coroutine(coroutine)
+    
+    def _finish_coroutine(self, coroutine: Coroutine):
+        coroutine.done = True
+        coroutine.waiting = None
+        coroutine.owner._coroutines.discard(coroutine)
+        # Ждавшие ее корутины продолжаются в следующем кадре
+        self._next_frame_coroutines.extend(coroutine._waiters)
+        coroutine._waiters = []
+    
+    def _step_coroutine(self, coroutine: Coroutine):
+        """Продвинуть корутину до следующего yield и поставить ее в нужную очередь"""
+        if coroutine.done:
+            return
+        coroutine.waiting = None
+        profiler = self.profiler if self.profiler.enabled else None
+        start = time.perf_counter_ns() if profiler else 0
+        try:
+            instruction = next(coroutine.routine)
+        except StopIteration:
+            instruction = None
+            self._finish_coroutine(coroutine)
+        except Exception as e:
+            instruction = None
+            print(f"Error in {coroutine.owner.__class__.__name__}.{coroutine.name}: {e}")
+            import traceback
+            traceback.print_exc()
+            self._finish_coroutine(coroutine)
+        if profiler:
+            profiler.record(coroutine.owner, coroutine.name, time.perf_counter_ns() - start)
+        if not coroutine.done:
+            self._schedule_coroutine(coroutine, instruction)
+    
+    def _schedule_coroutine(self, coroutine: Coroutine, instruction):
+        coroutine.waiting = instruction
+        if isinstance(instruction, WaitForSeconds):
+            self._coroutine_counter += 1
+            wake_time = self.time + instruction.seconds
+            heapq.heappush(self._coroutine_heap,
+                           (wake_time, self._coroutine_counter, self._frame_index, coroutine))
+        elif isinstance(instruction, WaitForFixedUpdate):
+            self._fixed_update_coroutines.append(coroutine)
+        elif isinstance(instruction, WaitUntil):
+            self._wait_until_coroutines.append(coroutine)
+        elif inspect.isgenerator(instruction) or isinstance(instruction, Coroutine):
+            # Вложенная корутина: продолжить после ее завершения
+            child = instruction
+            if not isinstance(child, Coroutine):
+                child = self.start_coroutine(coroutine.owner, child)
+            if child.done:
+                self._next_frame_coroutines.append(coroutine)
+            else:
+                child._waiters.append(coroutine)
+        else:
+            # yield None и прочие значения - следующий кадр
+            self._next_frame_coroutines.append(coroutine)
+    
+    def _resume_coroutines(self):
+        """Продолжить корутины, ждущие кадра, истекших WaitForSeconds и выполненных WaitUntil"""
+        ready, self._next_frame_coroutines = self._next_frame_coroutines, []
+        
+        # Ожидание, начатое в этом кадре, не заканчивается раньше следующего,
+        # даже WaitForSeconds(0)
+        heap = self._coroutine_heap
+        now = self.time
+        deferred = []
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if entry[2] == self._frame_index:
+                deferred.append(entry)
+            else:
+                ready.append(entry[3])
+        for entry in deferred:
+            heapq.heappush(heap, entry)
+        
+        if self._wait_until_coroutines:
+            waiting, self._wait_until_coroutines = self._wait_until_coroutines, []
+            for coroutine in waiting:
+                if coroutine.done:
+                    continue
+                try:
+                    condition = coroutine.waiting.predicate()
+                except Exception as e:
+                    print(f"Error in {coroutine.owner.__class__.__name__}.{coroutine.name} WaitUntil: {e}")
+                    self._finish_coroutine(coroutine)
+                    continue
+                if condition:
+                    ready.append(coroutine)
+                else:
+                    self._wait_until_coroutines.append(coroutine)
+        
+        for coroutine in ready:
+            self._step_coroutine(coroutine)
+    
+    def _resume_fixed_update_coroutines(self):
+        ready, self._fixed_update_coroutines = self._fixed_update_coroutines, []
+        for coroutine in ready:
+            self._step_coroutine(coroutine)
     
     def execute_method(self, method_name: str, delta_time: float = 0.0):
-        """Выполнить метод у всех скриптов в правильном порядке"""
-        for order in sorted(self._execution_groups.keys()):
-            for script in self._execution_groups[order]:
-                if script.enabled and hasattr(script, method_name):
-                    try:
-                        method = getattr(script, method_name)
-                        if delta_time > 0:
-                            method(delta_time)
-                        else:
-                            method()
-                    except Exception as e:
-                        print(f"Error in {script.__class__.__name__}.{method_name}: {e}")
-                        import traceback
-                        traceback.print_exc()
+        """Выполнить метод у скриптов, переопределивших его, в порядке выполнения"""
+        entries = self._dispatch.get(method_name)
+        if not entries:
+            return
+        if self.profiler.enabled:
+            self._execute_profiled(method_name, entries, delta_time)
+            return
+        # Копия списка: скрипты могут регистрироваться и удаляться во время вызова
+        for _, script, method, takes_delta in tuple(entries):
+            if script.enabled:
+                try:
+                    if takes_delta:
+                        method(delta_time)
+                    else:
+                        method()
+                except Exception as e:
+                    print(f"Error in {script.__class__.__name__}.{method_name}: {e}")
+                    import traceback
+                    traceback.print_exc()
+    
+    def _execute_profiled(self, method_name: str, entries: List[tuple], delta_time: float):
+        """Тот же цикл, что в execute_method, но с замером каждого вызова"""
+        profiler = self.profiler
+        clock = time.perf_counter_ns
+        for _, script, method, takes_delta in tuple(entries):
+            if script.enabled:
+                start = clock()
+                try:
+                    if takes_delta:
+                        method(delta_time)
+                    else:
+                        method()
+                except Exception as e:
+                    print(f"Error in {script.__class__.__name__}.{method_name}: {e}")
+                    import traceback
+                    traceback.print_exc()
+                profiler.record(script, method_name, clock() - start)
     
     def update(self, delta_time: float):
         """Обновить все скрипты"""
@@ -264,11 +729,19 @@ class ScriptEngine:
         self._fixed_time_accumulator += delta_time
         while self._fixed_time_accumulator >= self.fixed_time_step:
             self.execute_method('FixedUpdate', self.fixed_time_step)
+            if self._fixed_update_coroutines:
+                self._resume_fixed_update_coroutines()
             self._fixed_time_accumulator -= self.fixed_time_step
         
-        # Стандартное обновление
+        # Стандартное обновление; корутины продолжаются между Update и LateUpdate, как в Unity
+        self.time += delta_time
+        self._frame_index += 1
         self.execute_method('Update', delta_time)
+        self._resume_coroutines()
         self.execute_method('LateUpdate', delta_time)
+        
+        if self.profiler.enabled:
+            self.profiler.end_frame()
     
     def start_all(self):
         """Запустить все скрипты"""
@@ -277,40 +750,66 @@ class ScriptEngine:
         self.execute_method('OnEnable')
         
         # Start (только один раз)
-        for script in self.scripts:
-            if script.enabled and hasattr(script, 'Start') and not script._started:
+        profiler = self.profiler if self.profiler.enabled else None
+        with_start = set()
+        for _, script, method, _ in tuple(self._dispatch['Start']):
+            with_start.add(id(script))
+            if script.enabled and not script._started:
+                start = time.perf_counter_ns() if profiler else 0
                 try:
-                    script.Start()
+                    method()
                     script._started = True
                 except Exception as e:
+                    # Упавший Start повторится при следующем start_all
                     print(f"Error in {script.__class__.__name__}.Start: {e}")
+                if profiler:
+                    profiler.record(script, 'Start', time.perf_counter_ns() - start)
+        # Скрипты без своего Start считаются запущенными сразу
+        for script in self.scripts:
+            if script.enabled and id(script) not in with_start:
+                script._started = True
+        if profiler:
+            profiler.end_frame()
+    
+    def stop_all(self):
+        """Остановить все скрипты (выход из режима игры)"""
+        self.execute_method('OnDisable')
+        self.execute_method('OnDestroy')
+        for script in self.scripts:
+            self.stop_coroutines(script)
+            script._started = False
     
-    def load_script_from_file(self, file_path: str) -> Type[MonoBehaviour]:
-        """Загрузить скрипт из файла"""
+    def load_script_from_file(self, file_path: str, reload: bool = False) -> Type[MonoBehaviour]:
+        """Загрузить скрипт из файла.
+
+        Пока файл не менялся, повторная загрузка возвращает уже созданный класс;
+        иначе код берется из кэша байткода (compile_script) и выполняется заново.
+        """
         try:
+            path = os.path.abspath(file_path)
+            stat = os.stat(path)
+            loaded = self._script_classes.get(path)
+            if (loaded is not None and not reload and
+                    loaded[0] == stat.st_mtime_ns and loaded[1] == stat.st_size):
+                return loaded[2]
+            
             # Создаем уникальное имя модуля
             module_name = f"script_{os.path.basename(file_path).replace('.', '_')}"
             
-            # Загружаем исходный код
-            with open(file_path, 'r', encoding='utf-8') as f:
-                script_code = f.read()
+            # Загружаем код (из кэша, если исходник не менялся)
+            code = compile_script(path)
             
-            # Добавляем импорты для Unity-like API
-            script_code = f"""
-from core.scripting import MonoBehaviour, Time, Input, Debug, Mathf, Vector3
-import math
-
-{script_code}
-"""
             # Создаем модуль
             spec = importlib.util.spec_from_loader(module_name, loader=None)
             module = importlib.util.module_from_spec(spec)
+            module.__file__ = path
             
-            # Добавляем глобальные переменные
+            # Добавляем глобальные переменные и импорты Unity-like API
             module.__dict__.update(self.globals)
+            exec(_SCRIPT_PRELUDE, module.__dict__)
             
             # Выполняем код
-            exec(script_code, module.__dict__)
+            exec(code, module.__dict__)
             
             # Ищем классы, наследующиеся от MonoBehaviour
             script_classes = []
@@ -321,7 +820,9 @@ import math
                     script_classes.append(obj)
             
             if script_classes:
-                return script_classes[0]  # Возвращаем первый найденный класс
+                # Возвращаем первый найденный класс
+                self._script_classes[path] = (stat.st_mtime_ns, stat.st_size, script_classes[0])
+                return script_classes[0]
             
             return None
             
@@ -330,6 +831,92 @@ import math
             import traceback
             traceback.print_exc()
             return None
+    
+    def is_script_loaded(self, file_path: str) -> bool:
+        """Загружался ли класс из этого файла"""
+        return os.path.abspath(file_path) in self._script_classes
+    
+    def reload_script(self, file_path: str) -> Optional[int]:
+        """Перекомпилировать скрипт и подменить класс у живых экземпляров.
+
+        Возвращает число обновленных скриптов или None, если новая версия не загрузилась
+        (тогда экземпляры продолжают работать со старым классом). Значения полей
+        экземпляров сохраняются, поля, появившиеся в новой версии, получают копии
+        значений из ее __init__. Конструктор вызывается один раз на перезагрузку,
+        поэтому у скриптов он должен быть без побочных эффектов. В таблицах
+        диспетчеризации переставляются только записи затронутых скриптов.
+        Уже запущенные корутины досчитывают старый код.
+        """
+        path = os.path.abspath(file_path)
+        loaded = self._script_classes.get(path)
+        old_class = loaded[2] if loaded else None
+        new_class = self.load_script_from_file(path, reload=True)
+        if new_class is None:
+            return None
+        if old_class is None or old_class is new_class:
+            return 0
+        
+        live = [script for script in self.scripts if type(script) is old_class]
+        if not live:
+            _script_class_cache.pop(old_class, None)
+            return 0
+        
+        # Значения по умолчанию новых полей - из одного экземпляра на всю перезагрузку
+        try:
+            defaults = vars(new_class())
+        except Exception as e:
+            print(f"Error in {new_class.__name__}.__init__ during reload: {e}")
+            defaults = {}
+        
+        updated = 0
+        for script in live:
+            self._remove_from_dispatch(script)
+            for name, value in defaults.items():
+                if name not in script.__dict__:
+                    try:
+                        script.__dict__[name] = copy.deepcopy(value)
+                    except Exception:
+                        script.__dict__[name] = value
+            try:
+                script.__class__ = new_class
+                updated += 1
+            except TypeError as e:
+                print(f"Error reloading {old_class.__name__}: {e}")
+            script._dispatch_key = (_script_class_info(type(script)).order, script._dispatch_key[1])
+            self._add_to_dispatch(script)
+        _script_class_cache.pop(old_class, None)
+        return updated
+    
+    def precompile_scripts(self, directory: str, workers: Optional[int] = None) -> int:
+        """Заполнить кэш байткода для всех .py в папке (рекурсивно); возвращает число скриптов.
+
+        Классы не создаются - это делает load_script_from_file при первом обращении,
+        но уже без компиляции. При workers > 1 файлы компилируются в пуле процессов
+        (workers <= 0 - по числу ядер).
+        """
+        paths = []
+        for root, folders, files in os.walk(directory):
+            folders[:] = [folder for folder in folders if folder != '__pycache__']
+            paths.extend(os.path.join(root, name) for name in files if name.endswith('.py'))
+        
+        if workers is None:
+            workers = 1
+        elif workers <= 0:
+            workers = os.cpu_count() or 1
+        
+        if workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+                errors = list(executor.map(_precompile_script, paths, chunksize=16))
+        else:
+            errors = [_precompile_script(path) for path in paths]
+        
+        compiled = 0
+        for path, error in zip(paths, errors):
+            if error is None:
+                compiled += 1
+            else:
+                print(f"Error compiling script {path}: {error}")
+        return compiled
 
 # ========== UNITY-LIKE API CLASSES ==========
 
@@ -459,13 +1046,28 @@ class Mathf:
         return output
 
 class Vector3:
-    """Аналог UnityEngine.Vector3"""
+    """Аналог UnityEngine.Vector3.
+
+    Операторы +, -, *, / создают новый вектор; +=, -=, *=, /= меняют вектор на месте
+    без выделения памяти. Для массовых операций над многими векторами - Vector3Array.
+    """
+    __slots__ = ('x', 'y', 'z')
     
     def __init__(self, x: float = 0.0, y: float = 0.0, z: float = 0.0):
         self.x = x
         self.y = y
         self.z = z
     
+    def set(self, x: float, y: float, z: float):
+        """Задать компоненты на месте"""
+        self.x = x
+        self.y = y
+        self.z = z
+        return self
+    
+    def copy(self):
+        return Vector3(self.x, self.y, self.z)
+    
     def __add__(self, other):
         return Vector3(self.x + other.x, self.y + other.y, self.z + other.z)
     
@@ -475,18 +1077,62 @@ class Vector3:
     def __mul__(self, scalar):
         return Vector3(self.x * scalar, self.y * scalar, self.z * scalar)
     
+    __rmul__ = __mul__
+    
     def __truediv__(self, scalar):
         return Vector3(self.x / scalar, self.y / scalar, self.z / scalar)
     
+    def __neg__(self):
+        return Vector3(-self.x, -self.y, -self.z)
+    
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        return self
+    
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+    
+    def __imul__(self, scalar):
+        self.x *= scalar
+        self.y *= scalar
+        self.z *= scalar
+        return self
+    
+    def __itruediv__(self, scalar):
+        self.x /= scalar
+        self.y /= scalar
+        self.z /= scalar
+        return self
+    
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+    
     def magnitude(self) -> float:
         return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
     
+    def sqr_magnitude(self) -> float:
+        return self.x * self.x + self.y * self.y + self.z * self.z
+    
     def normalized(self):
         mag = self.magnitude()
         if mag > 0:
             return self / mag
         return Vector3()
     
+    def normalize(self):
+        """Нормализовать на месте"""
+        mag = self.magnitude()
+        if mag > 0:
+            self /= mag
+        return self
+    
     def dot(self, other) -> float:
         return self.x * other.x + self.y * other.y + self.z * other.z
     
@@ -499,7 +1145,10 @@ class Vector3:
     
     @staticmethod
     def distance(a, b) -> float:
-        return (a - b).magnitude()
+        dx = a.x - b.x
+        dy = a.y - b.y
+        dz = a.z - b.z
+        return math.sqrt(dx * dx + dy * dy + dz * dz)
     
     @staticmethod
     def lerp(a, b, t: float):
@@ -520,11 +1169,162 @@ class Vector3:
         
         return current + to_vector / distance * max_distance_delta
     
+    def __repr__(self):
+        return f"Vector3({self.x}, {self.y}, {self.z})"
+    
     def __str__(self):
         return f"({self.x}, {self.y}, {self.z})"
 
+class Vector3Array:
+    """Массив векторов поверх ndarray (N, 3) с тем же API, что у Vector3.
+
+    Операции выполняются NumPy над всем массивом сразу. Вторым операндом +/- может
+    быть Vector3Array, Vector3 или массив (N, 3) / (3,); у * и / - число или массив
+    (N,) со своим множителем для каждого вектора. Срез и x/y/z - представления данных.
+    """
+    __slots__ = ('data',)
+    
+    def __init__(self, data=None, dtype=np.float64):
+        if data is None:
+            data = np.zeros((0, 3), dtype=dtype)
+        elif isinstance(data, Vector3Array):
+            data = data.data.copy()
+        elif isinstance(data, (list, tuple)) and data and isinstance(data[0], Vector3):
+            data = np.array([(v.x, v.y, v.z) for v in data], dtype=dtype)
+        self.data = np.asarray(data, dtype=dtype).reshape(-1, 3)
+    
+    @classmethod
+    def zeros(cls, count: int, dtype=np.float64):
+        return cls(np.zeros((count, 3), dtype=dtype))
+    
+    @staticmethod
+    def _vectors(other):
+        if isinstance(other, Vector3Array):
+            return other.data
+        if isinstance(other, Vector3):
+            return np.array((other.x, other.y, other.z))
+        return np.asarray(other)
+    
+    @staticmethod
+    def _scalars(other):
+        other = np.asarray(other)
+        return other[:, None] if other.ndim == 1 else other
+    
+    def copy(self):
+        return Vector3Array(self.data.copy())
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Vector3(*self.data[index].tolist())
+        return Vector3Array(self.data[index])
+    
+    def __setitem__(self, index, value):
+        self.data[index] = self._vectors(value)
+    
+    @property
+    def x(self):
+        return self.data[:, 0]
+    
+    @property
+    def y(self):
+        return self.data[:, 1]
+    
+    @property
+    def z(self):
+        return self.data[:, 2]
+    
+    def __add__(self, other):
+        return Vector3Array(self.data + self._vectors(other))
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other):
+        return Vector3Array(self.data - self._vectors(other))
+    
+    def __rsub__(self, other):
+        return Vector3Array(self._vectors(other) - self.data)
+    
+    def __mul__(self, scalar):
+        return Vector3Array(self.data * self._scalars(scalar))
+    
+    __rmul__ = __mul__
+    
+    def __truediv__(self, scalar):
+        return Vector3Array(self.data / self._scalars(scalar))
+    
+    def __neg__(self):
+        return Vector3Array(-self.data)
+    
+    def __iadd__(self, other):
+        self.data += self._vectors(other)
+        return self
+    
+    def __isub__(self, other):
+        self.data -= self._vectors(other)
+        return self
+    
+    def __imul__(self, scalar):
+        self.data *= self._scalars(scalar)
+        return self
+    
+    def __itruediv__(self, scalar):
+        self.data /= self._scalars(scalar)
+        return self
+    
+    def magnitude(self):
+        return np.sqrt(self.sqr_magnitude())
+    
+    def sqr_magnitude(self):
+        return np.einsum('ij,ij->i', self.data, self.data)
+    
+    def normalized(self):
+        return self.copy().normalize()
+    
+    def normalize(self):
+        """Нормализовать на месте; нулевые векторы остаются нулевыми"""
+        mag = self.magnitude()
+        np.divide(self.data, mag[:, None], out=self.data, where=mag[:, None] > 0)
+        return self
+    
+    def dot(self, other):
+        other = self._vectors(other)
+        return np.einsum('ij,ij->i', self.data, np.broadcast_to(other, self.data.shape))
+    
+    def cross(self, other):
+        return Vector3Array(np.cross(self.data, self._vectors(other)))
+    
+    @staticmethod
+    def distance(a, b):
+        return (a - b).magnitude()
+    
+    @staticmethod
+    def lerp(a, b, t):
+        t = np.clip(Vector3Array._scalars(t), 0.0, 1.0)
+        a = Vector3Array._vectors(a)
+        return Vector3Array(a + (Vector3Array._vectors(b) - a) * t)
+    
+    @staticmethod
+    def move_towards(current, target, max_distance_delta):
+        current = Vector3Array._vectors(current)
+        to_vector = Vector3Array._vectors(target) - current
+        distance = np.sqrt(np.einsum('ij,ij->i', to_vector, to_vector))
+        step = np.minimum(1.0, np.divide(max_distance_delta, distance,
+                                         out=np.ones_like(distance), where=distance > 0))
+        return Vector3Array(current + to_vector * step[:, None])
+    
+    def __repr__(self):
+        return f"Vector3Array({len(self.data)})"
+
 class Quaternion:
-    """Аналог UnityEngine.Quaternion"""
+    """Аналог UnityEngine.Quaternion.
+
+    Углы в градусах, как в Unity и у GameObject.rotation. Эйлеров поворот применяется
+    в порядке Z, X, Y: euler(x, y, z) = angle_axis(y, up) * angle_axis(x, right) * angle_axis(z, forward).
+    """
+    __slots__ = ('x', 'y', 'z', 'w')
     
     def __init__(self, x: float = 0.0, y: float = 0.0, z: float = 0.0, w: float = 1.0):
         self.x = x
@@ -532,27 +1332,133 @@ class Quaternion:
         self.z = z
         self.w = w
     
+    @staticmethod
+    def identity():
+        return Quaternion()
+    
     @staticmethod
     def euler(x: float, y: float, z: float):
         """Создать из углов Эйлера"""
-        # Упрощенная реализация
-        return Quaternion()
+        hx, hy, hz = math.radians(x) * 0.5, math.radians(y) * 0.5, math.radians(z) * 0.5
+        cx, sx = math.cos(hx), math.sin(hx)
+        cy, sy = math.cos(hy), math.sin(hy)
+        cz, sz = math.cos(hz), math.sin(hz)
+        return Quaternion(
+            cy * sx * cz + sy * cx * sz,
+            sy * cx * cz - cy * sx * sz,
+            cy * cx * sz - sy * sx * cz,
+            cy * cx * cz + sy * sx * sz
+        )
     
     @staticmethod
     def angle_axis(angle: float, axis: Vector3):
         """Создать из угла и оси"""
-        # Упрощенная реализация
-        return Quaternion()
+        length = axis.magnitude()
+        if length == 0:
+            return Quaternion()
+        half = math.radians(angle) * 0.5
+        s = math.sin(half) / length
+        return Quaternion(axis.x * s, axis.y * s, axis.z * s, math.cos(half))
     
     def __mul__(self, other):
-        """Умножение кватернионов"""
-        # Упрощенная реализация
-        return Quaternion()
+        """Произведение кватернионов или поворот Vector3 / Vector3Array"""
+        if isinstance(other, Quaternion):
+            return Quaternion(*self._product(other))
+        if isinstance(other, Vector3):
+            # v' = v + w*t + q x t, где t = 2 (q x v)
+            qx, qy, qz, qw = self.x, self.y, self.z, self.w
+            tx = 2.0 * (qy * other.z - qz * other.y)
+            ty = 2.0 * (qz * other.x - qx * other.z)
+            tz = 2.0 * (qx * other.y - qy * other.x)
+            return Vector3(
+                other.x + qw * tx + qy * tz - qz * ty,
+                other.y + qw * ty + qz * tx - qx * tz,
+                other.z + qw * tz + qx * ty - qy * tx
+            )
+        if isinstance(other, Vector3Array):
+            q = np.array((self.x, self.y, self.z))
+            t = 2.0 * np.cross(q, other.data)
+            return Vector3Array(other.data + self.w * t + np.cross(q, t))
+        return NotImplemented
+    
+    def __imul__(self, other):
+        if not isinstance(other, Quaternion):
+            return NotImplemented
+        self.x, self.y, self.z, self.w = self._product(other)
+        return self
+    
+    def _product(self, other):
+        ax, ay, az, aw = self.x, self.y, self.z, self.w
+        bx, by, bz, bw = other.x, other.y, other.z, other.w
+        return (
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz
+        )
+    
+    def dot(self, other) -> float:
+        return self.x * other.x + self.y * other.y + self.z * other.z + self.w * other.w
+    
+    def inverse(self):
+        """Обратный поворот (для единичного кватерниона - сопряженный)"""
+        norm = self.dot(self)
+        if norm == 0:
+            return Quaternion()
+        return Quaternion(-self.x / norm, -self.y / norm, -self.z / norm, self.w / norm)
+    
+    def normalized(self):
+        norm = math.sqrt(self.dot(self))
+        if norm == 0:
+            return Quaternion()
+        return Quaternion(self.x / norm, self.y / norm, self.z / norm, self.w / norm)
+    
+    @staticmethod
+    def angle(a, b) -> float:
+        """Угол между поворотами в градусах"""
+        d = min(abs(a.dot(b)), 1.0)
+        return math.degrees(2.0 * math.acos(d))
+    
+    @staticmethod
+    def slerp(a, b, t: float):
+        """Сферическая интерполяция по кратчайшей дуге"""
+        t = Mathf.Clamp(t, 0, 1)
+        d = a.dot(b)
+        bx, by, bz, bw = b.x, b.y, b.z, b.w
+        if d < 0.0:
+            d = -d
+            bx, by, bz, bw = -bx, -by, -bz, -bw
+        if d > 0.9995:
+            # Почти совпадают - линейная интерполяция с нормализацией
+            return Quaternion(a.x + (bx - a.x) * t, a.y + (by - a.y) * t,
+                              a.z + (bz - a.z) * t, a.w + (bw - a.w) * t).normalized()
+        theta = math.acos(d)
+        sin_theta = math.sin(theta)
+        wa = math.sin((1.0 - t) * theta) / sin_theta
+        wb = math.sin(t * theta) / sin_theta
+        return Quaternion(a.x * wa + bx * wb, a.y * wa + by * wb,
+                          a.z * wa + bz * wb, a.w * wa + bw * wb)
     
     def euler_angles(self):
-        """Получить углы Эйлера"""
-        # Упрощенная реализация
-        return Vector3()
+        """Получить углы Эйлера (градусы в [0, 360), как в Unity)"""
+        x, y, z, w = self.x, self.y, self.z, self.w
+        # Элементы матрицы поворота R = Ry * Rx * Rz
+        m02 = 2.0 * (x * z + w * y)
+        m12 = 2.0 * (y * z - w * x)
+        m22 = 1.0 - 2.0 * (x * x + y * y)
+        angle_x = math.asin(Mathf.Clamp(-m12, -1.0, 1.0))
+        if math.hypot(m02, m22) > 1e-9:
+            angle_y = math.atan2(m02, m22)
+            angle_z = math.atan2(2.0 * (x * y + w * z), 1.0 - 2.0 * (x * x + z * z))
+        else:
+            # Шарнирный замок: поворот вокруг Z неотличим от поворота вокруг Y
+            angle_y = math.atan2(-2.0 * (x * z - w * y), 1.0 - 2.0 * (y * y + z * z))
+            angle_z = 0.0
+        return Vector3(math.degrees(angle_x) % 360.0, math.degrees(angle_y) % 360.0,
+                       math.degrees(angle_z) % 360.0)
+    
+    def __repr__(self):
+        return f"Quaternion({self.x}, {self.y}, {self.z}, {self.w})"
 
 # Глобальные инстансы
 _time = Time()
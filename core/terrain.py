@@ -2,18 +2,69 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QSlider,
                              QPushButton, QLabel, QDoubleSpinBox, QGroupBox,
                              QFormLayout, QComboBox, QCheckBox, QToolBar,
                              QAction, QSplitter, QScrollArea, QFrame,
-                             QSizePolicy, QTabWidget, QRadioButton, QButtonGroup)
+                             QSizePolicy, QTabWidget, QRadioButton, QButtonGroup,
+                             QListWidget, QListWidgetItem, QLineEdit, QDockWidget)
 from PyQt5.QtCore import Qt, QPoint, QSize, pyqtSignal
 from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QImage, QPixmap, QIcon
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from PIL import Image
-import noise
+import ctypes
+import heapq
 import random
 from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple
 import json
+from collections import OrderedDict
+from enum import Enum
+
+from .terrain_noise import generate_fbm_heightmap
+from .optimization import Frustum
+from .terrain_streaming import TerrainTileStore
+from .terrain_history import TerrainHistory
+from .plugin_system import Plugin
+
+MAX_TERRAIN_LAYERS = 16  # По 4 слоя на RGBA-карту весов
+LAYER_TEXTURE_SIZE = 512  # Размер слоя в массиве текстур
+
+_SPLAT_VERTEX_SHADER = """
+#version 130
+out vec2 v_uv;
+out vec3 v_normal;
+void main() {
+    v_uv = gl_MultiTexCoord0.xy;
+    v_normal = gl_Normal;
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+}
+"""
+
+_SPLAT_FRAGMENT_SHADER = """
+#version 130
+uniform sampler2DArray u_layers;
+uniform sampler2DArray u_weights;
+uniform int u_layer_count;
+uniform float u_tiling[16];
+uniform float u_enabled[16];
+uniform vec3 u_light_direction;
+in vec2 v_uv;
+in vec3 v_normal;
+void main() {
+    vec3 color = vec3(0.0);
+    float total = 0.0;
+    for (int i = 0; i < u_layer_count; ++i) {
+        float weight = texture(u_weights, vec3(v_uv, float(i / 4)))[i % 4] * u_enabled[i];
+        if (weight > 0.0) {
+            color += weight * texture(u_layers, vec3(v_uv * u_tiling[i], float(i))).rgb;
+            total += weight;
+        }
+    }
+    // Веса в uint8 не всегда дают в сумме ровно 1, поэтому нормализуем
+    color = total > 0.0 ? color / total : texture(u_layers, vec3(v_uv * u_tiling[0], 0.0)).rgb;
+    float diffuse = 0.25 + 0.75 * max(dot(normalize(v_normal), normalize(u_light_direction)), 0.0);
+    gl_FragColor = vec4(color * diffuse, 1.0);
+}
+"""
 
 class TerrainBrushType(Enum):
     RAISE = "raise"
@@ -34,213 +85,749 @@ class TerrainLayer:
     def __init__(self, name: str, texture_path: str = None):
         self.name = name
         self.texture_path = texture_path
-        self.texture_id = None
         self.tiling = 10.0
         self.metallic = 0.0
         self.roughness = 0.8
         self.normal_strength = 1.0
         self.enabled = True
         
-    def load_texture(self):
+    def load_image(self, size: int) -> np.ndarray:
+        """RGB-изображение слоя size x size для массива текстур; при ошибке - серый цвет"""
         if self.texture_path:
             try:
                 image = Image.open(self.texture_path)
                 if image.mode != 'RGB':
                     image = image.convert('RGB')
                 image = image.transpose(Image.FLIP_TOP_BOTTOM)
-                img_data = np.array(image, np.uint8)
-                
-                self.texture_id = glGenTextures(1)
-                glBindTexture(GL_TEXTURE_2D, self.texture_id)
-                glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, image.width, image.height, 
-                            0, GL_RGB, GL_UNSIGNED_BYTE, img_data)
-                
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-                
-                glGenerateMipmap(GL_TEXTURE_2D)
-                glBindTexture(GL_TEXTURE_2D, 0)
-                
+                if image.size != (size, size):
+                    image = image.resize((size, size), Image.BILINEAR)
+                return np.asarray(image, dtype=np.uint8)
             except Exception as e:
                 print(f"Error loading terrain texture {self.texture_path}: {e}")
+        return np.full((size, size, 3), 128, dtype=np.uint8)
+
+class TerrainChunk:
+    """Прямоугольный участок сетки со своими вершинными буферами по уровням LOD"""
+    def __init__(self, z0: int, z1: int, x0: int, x1: int):
+        # Диапазоны вершин [z0, z1) x [x0, x1); граничные вершины дублируются у соседей
+        self.z0 = z0
+        self.z1 = z1
+        self.x0 = x0
+        self.x1 = x1
+        self.lod_buffers = {}  # шаг сетки -> VBO прореженных вершин (позиция, нормаль, UV)
+        self.dirty_rect = None  # [z0, z1, x0, x1] вершин, требующих обновления
+        self.lod_step = 1  # Шаг сетки, выбранный на последнем кадре
+        
+    def mark_dirty(self, z0: int, z1: int, x0: int, x1: int):
+        z0, z1 = max(z0, self.z0), min(z1, self.z1)
+        x0, x1 = max(x0, self.x0), min(x1, self.x1)
+        if z0 >= z1 or x0 >= x1:
+            return False
+        if self.dirty_rect is None:
+            self.dirty_rect = [z0, z1, x0, x1]
+        else:
+            rect = self.dirty_rect
+            self.dirty_rect = [min(rect[0], z0), max(rect[1], z1), min(rect[2], x0), max(rect[3], x1)]
+        return True
+
+def _lod_positions(count: int, step: int) -> np.ndarray:
+    """Позиции вершин стороны из count вершин с шагом step; последняя вершина всегда включена"""
+    return np.append(np.arange(0, count - 1, step), count - 1)
+
+def _zip_chains(outer, inner) -> List[Tuple[int, int, int]]:
+    """Триангуляция полосы между двумя параллельными цепочками вершин [(позиция, индекс)]"""
+    triangles = []
+    i = j = 0
+    while i < len(outer) - 1 or j < len(inner) - 1:
+        if j == len(inner) - 1 or (i < len(outer) - 1 and outer[i + 1][0] <= inner[j + 1][0]):
+            triangles.append((outer[i][1], outer[i + 1][1], inner[j][1]))
+            i += 1
+        else:
+            triangles.append((outer[i][1], inner[j + 1][1], inner[j][1]))
+            j += 1
+    return triangles
+
+def _lod_grid_indices(rows: int, cols: int, step: int, edge_steps: Tuple[int, int, int, int]) -> np.ndarray:
+    """Индексы чанка rows x cols вершин, прореженного с шагом step.
+
+    edge_steps - шаги сторон (z0, z1, x0, x1). Внутренняя часть - обычная сетка,
+    а полоса вдоль каждой стороны сшивается с вершинами стороны по ее шагу,
+    поэтому стороны совпадают с более грубыми соседями и трещин нет.
+    """
+    zs = _lod_positions(rows, step).tolist()
+    xs = _lod_positions(cols, step).tolist()
+    top, bottom, left, right = edge_steps
+    
+    def row(z, positions):
+        return [(x, z * cols + x) for x in positions]
+    
+    def column(x, positions):
+        return [(z, z * cols + x) for z in positions]
+    
+    if len(zs) < 3 or len(xs) < 3:
+        # Внутренней части нет: одна полоса между противоположными сторонами
+        if len(zs) == 2:
+            triangles = _zip_chains(row(0, _lod_positions(cols, top)), row(rows - 1, _lod_positions(cols, bottom)))
+        else:
+            triangles = _zip_chains(column(0, _lod_positions(rows, left)), column(cols - 1, _lod_positions(rows, right)))
+        triangles = np.array(triangles, dtype=np.int64)
+    else:
+        inner_z = np.array(zs[1:-1])
+        inner_x = np.array(xs[1:-1])
+        ids = inner_z[:, None] * cols + inner_x[None, :]
+        i0, i1, i2, i3 = ids[:-1, :-1], ids[:-1, 1:], ids[1:, :-1], ids[1:, 1:]
+        strips = (_zip_chains(row(0, _lod_positions(cols, top)), row(zs[1], xs[1:-1])) +
+                  _zip_chains(row(rows - 1, _lod_positions(cols, bottom)), row(zs[-2], xs[1:-1])) +
+                  _zip_chains(column(0, _lod_positions(rows, left)), column(xs[1], zs[1:-1])) +
+                  _zip_chains(column(cols - 1, _lod_positions(rows, right)), column(xs[-2], zs[1:-1])))
+        triangles = np.concatenate([np.stack([i0, i1, i2, i2, i1, i3], axis=-1).reshape(-1, 3),
+                                    np.array(strips, dtype=np.int64).reshape(-1, 3)])
+    
+    # Полосы строятся без учета обхода: приводим к обходу основной сетки
+    z, x = np.divmod(triangles, cols)
+    area = (x[:, 1] - x[:, 0]) * (z[:, 2] - z[:, 0]) - (x[:, 2] - x[:, 0]) * (z[:, 1] - z[:, 0])
+    triangles[area < 0] = triangles[area < 0][:, [0, 2, 1]]
+    return triangles.astype(np.uint32).reshape(-1)
+
+def _compact_lod_indices(indices: np.ndarray, rows: int, cols: int, step: int) -> np.ndarray:
+    """Перевести индексы полной сетки чанка в индексы его вершин, прореженных с шагом step.
+
+    Вершины сторон с более грубым шагом соседа входят в прореженную сетку,
+    поэтому все индексы _lod_grid_indices в ней есть.
+    """
+    zs, xs = _lod_positions(rows, step), _lod_positions(cols, step)
+    row_map = np.zeros(rows, dtype=np.uint32)
+    col_map = np.zeros(cols, dtype=np.uint32)
+    row_map[zs] = np.arange(len(zs))
+    col_map[xs] = np.arange(len(xs))
+    z, x = np.divmod(indices, cols)
+    return (row_map[z] * len(xs) + col_map[x]).astype(np.uint32)
+
+# Вершина чанка в буфере: позиция, нормаль, UV
+_CHUNK_VERTEX_FLOATS = 8
+_CHUNK_VERTEX_STRIDE = _CHUNK_VERTEX_FLOATS * 4
+
+def _reduce_blocks(values: np.ndarray, op) -> np.ndarray:
+    """Свертка блоков 2x2 (нечетный край дополняется повтором) операцией np.minimum/np.maximum"""
+    rows, cols = values.shape
+    if rows % 2 or cols % 2:
+        values = np.pad(values, ((0, rows % 2), (0, cols % 2)), mode='edge')
+    blocks = values.reshape(values.shape[0] // 2, 2, values.shape[1] // 2, 2)
+    return op.reduce(op.reduce(blocks, axis=3), axis=1)
+
+def _ray_box(origin, inverse, low, high, t_max):
+    """Расстояние входа луча в AABB (метод плит) или None"""
+    t_enter, t_exit = 0.0, t_max
+    for o, inv, lo, hi in zip(origin, inverse, low, high):
+        a = (lo - o) * inv
+        b = (hi - o) * inv
+        if a > b:
+            a, b = b, a
+        if a > t_enter:
+            t_enter = a
+        if b < t_exit:
+            t_exit = b
+        if t_enter > t_exit:
+            return None
+    return t_enter
+
+def _ray_triangle(origin, direction, p0, p1, p2):
+    """Пересечение луча с треугольником (Моллер-Трумбор); расстояние или None"""
+    edge1 = p1 - p0
+    edge2 = p2 - p0
+    pvec = np.cross(direction, edge2)
+    det = edge1 @ pvec
+    if abs(det) < 1e-12:
+        return None
+    inv_det = 1.0 / det
+    tvec = origin - p0
+    u = (tvec @ pvec) * inv_det
+    if u < 0.0 or u > 1.0:
+        return None
+    qvec = np.cross(tvec, edge1)
+    v = (direction @ qvec) * inv_det
+    if v < 0.0 or u + v > 1.0:
+        return None
+    t = (edge2 @ qvec) * inv_det
+    return t if t >= 0.0 else None
+
+class TerrainQuadNode:
+    """Узел квадродерева над чанками [cz0, cz1) x [cx0, cx1); лист хранит один чанк"""
+    def __init__(self, cz0: int, cz1: int, cx0: int, cx1: int):
+        self.cz0 = cz0
+        self.cz1 = cz1
+        self.cx0 = cx0
+        self.cx1 = cx1
+        self.children: List['TerrainQuadNode'] = []
+        self.chunk: Optional[TerrainChunk] = None
+        self.bounds = None  # AABB [min_x, min_y, min_z, max_x, max_y, max_z]
 
 class Terrain:
-    def __init__(self, width=100, height=100, resolution=1.0):
+    def __init__(self, width=100, height=100, resolution=1.0, chunk_size=64):
         self.width = width
         self.height = height
         self.resolution = resolution
         self.heightmap = np.zeros((height, width), dtype=np.float32)
-        self.texture_map = np.zeros((height, width, 4), dtype=np.float32)  # RGBA splatmap
+        self.texture_map = np.zeros((height, width, 4), dtype=np.uint8)  # Веса слоев, по 4 на RGBA-карту
         self.normal_map = None
         self.layers: List[TerrainLayer] = []
-        self.vertex_buffer = None
-        self.normal_buffer = None
-        self.uv_buffer = None
-        self.index_buffer = None
         self.dirty = True  # Флаг необходимости пересчета геометрии
+        self.splat_dirty = True  # Флаг необходимости загрузки splat-карты
+        self.layers_dirty = True  # Флаг необходимости сборки массива текстур слоев
+        self.light_direction = (0.4, 1.0, 0.3)
+        self._splat_dirty_rect = None  # [z0, z1, x0, x1] для частичной загрузки весов
+        self.splat_texture = None  # GL_TEXTURE_2D_ARRAY карт весов
+        self.layer_texture_array = None  # GL_TEXTURE_2D_ARRAY текстур слоев
+        self._splat_shader = None
+        self._splat_uniforms = {}
+        
+        # Сетка разбита на чанки по chunk_size квадов. Вершинные буферы создаются
+        # только для видимых чанков и только нужного шага сетки; давно не рисованные
+        # вытесняются при превышении chunk_buffer_budget_mb
+        self.chunk_size = chunk_size
+        self.chunks: List[List[TerrainChunk]] = []
+        self._dirty_chunks = set()
+        self._grid_shape = None
+        self.chunk_buffer_budget_mb = 64.0
+        self._resident_buffers = OrderedDict()  # (чанк, шаг) -> [байты, номер кадра], порядок LRU
+        self.resident_buffer_bytes = 0
+        self._frame_index = 0
+        
+        # LOD по квадродереву: шаг сетки чанка выбирается по экранному размеру квада
+        self.lod_pixel_error = 4.0  # Желаемый размер квада на экране, пикс
+        self._quadtree: Optional[TerrainQuadNode] = None
+        self._chunk_bounds = None  # (nz, nx, 6) AABB чанков
+        self._lod_index_buffers = {}  # (rows, cols, step, стороны) -> (буфер, число индексов)
+        self.visible_chunks: List[TerrainChunk] = []
+        self.drawn_triangles = 0
+        
+        # Пирамида [(min, max)] высот по клеткам для трассировки лучей, строится по запросу
+        self._height_pyramid = None
+        
+        # История правок кистями (undo/redo по тайлам)
+        self.history = TerrainHistory(self)
         
     def generate_from_heightmap(self, heightmap_path: str):
+        """Загрузка высот из изображения (8 или 16 бит) с масштабированием до размеров террейна.
+
+        Для карт, не помещающихся в память, используйте import_heightmap_image и load_tiles.
+        """
         try:
-            image = Image.open(heightmap_path).convert('L')
-            image = image.resize((self.width, self.height))
-            self.heightmap = np.array(image, dtype=np.float32) / 255.0
+            image = Image.open(heightmap_path)
+            if image.mode.startswith('I'):
+                image = image.convert('I')
+                scale = 1.0 / 65535.0
+            else:
+                image = image.convert('L')
+                scale = 1.0 / 255.0
+            if image.size != (self.width, self.height):
+                # reducing_gap сначала уменьшает изображение целочисленно, что намного быстрее
+                image = image.resize((self.width, self.height), Image.BILINEAR, reducing_gap=3.0)
+            self.heightmap = np.asarray(image, dtype=np.float32) * np.float32(scale)
+            self._height_pyramid = None
+            self.history.clear()
             self.dirty = True
         except Exception as e:
             print(f"Error loading heightmap: {e}")
             
-    def generate_perlin_noise(self, scale=50.0, octaves=6, persistence=0.5, lacunarity=2.0):
-        """Генерация террейна на основе шума Перлина"""
-        world_x = np.linspace(0, scale, self.width)
-        world_y = np.linspace(0, scale, self.height)
-        x, y = np.meshgrid(world_x, world_y)
-        
-        self.heightmap = np.zeros((self.height, self.width))
-        
-        for i in range(self.height):
-            for j in range(self.width):
-                self.heightmap[i][j] = noise.pnoise2(
-                    x[i][j], y[i][j],
-                    octaves=octaves,
-                    persistence=persistence,
-                    lacunarity=lacunarity,
-                    repeatx=scale,
-                    repeaty=scale,
-                    base=42
-                )
-        
-        # Нормализуем высоты от 0 до 1
-        self.heightmap = (self.heightmap - self.heightmap.min()) / (self.heightmap.max() - self.heightmap.min())
+    def generate_perlin_noise(self, scale=50.0, octaves=6, persistence=0.5, lacunarity=2.0, workers=None):
+        """Генерация террейна на основе шума Перлина (векторно, по полосам).
+
+        workers > 1 включает расчет полос в пуле процессов для больших карт.
+        """
+        self.heightmap = generate_fbm_heightmap(
+            self.width, self.height,
+            scale=scale,
+            octaves=octaves,
+            persistence=persistence,
+            lacunarity=lacunarity,
+            base=42,
+            workers=workers
+        )
+        self._height_pyramid = None
+        self.history.clear()
+        self.dirty = True
+        
+    def save_tiles(self, path: str, tile_size: int = 256, height_format: str = 'uint16') -> TerrainTileStore:
+        """Сохранить высоты и splat-карту в тайловое хранилище (см. TerrainTileStore)"""
+        store = TerrainTileStore.create(path, self.width, self.height, self.resolution, tile_size, height_format,
+                                        (float(self.heightmap.min()), float(self.heightmap.max())),
+                                        self.texture_map.shape[2])
+        store.write_region(0, 0, heights=self.heightmap, splat=self.texture_map)
+        store.flush()
+        return store
+        
+    def load_tiles(self, path: str, region: Optional[Tuple[int, int, int, int]] = None):
+        """Загрузить террейн из тайлового хранилища целиком или область вершин [z0, z1, x0, x1].
+
+        Читаются только тайлы, пересекающие область, но сама область целиком лежит
+        в памяти как плотная сетка. Если карта в память не помещается, загружайте
+        область вокруг камеры. Потоковая подгрузка тайлов (TerrainStreamer) с
+        Terrain не связана, ее update() вызывает код, создавший стример.
+        """
+        store = TerrainTileStore(path)
+        z0, z1, x0, x1 = region if region is not None else (0, store.height, 0, store.width)
+        heights, splat = store.read_region(z0, z1, x0, x1)
+        self.height, self.width = heights.shape
+        self.resolution = store.resolution
+        self.heightmap = heights
+        self.texture_map = splat
+        self._height_pyramid = None
+        self.history.clear()
         self.dirty = True
+        self.splat_dirty = True
+        return store
         
     def add_layer(self, layer: TerrainLayer):
+        if len(self.layers) >= MAX_TERRAIN_LAYERS:
+            print(f"Terrain supports at most {MAX_TERRAIN_LAYERS} layers")
+            return
         self.layers.append(layer)
-        layer.load_texture()
-        
-    def update_normals(self):
-        """Вычисление нормалей для террейна"""
-        self.normal_map = np.zeros((self.height, self.width, 3), dtype=np.float32)
-        
-        for z in range(1, self.height - 1):
-            for x in range(1, self.width - 1):
-                # Высоты соседних точек
-                left = self.heightmap[z][x-1]
-                right = self.heightmap[z][x+1]
-                down = self.heightmap[z-1][x]
-                up = self.heightmap[z+1][x]
-                
-                # Вектора нормали
-                normal_x = (left - right) * 0.5
-                normal_y = 1.0  # Вертикальная компонента
-                normal_z = (down - up) * 0.5
-                
-                # Нормализуем
-                length = max(1e-6, np.sqrt(normal_x**2 + normal_y**2 + normal_z**2))
-                self.normal_map[z][x] = [normal_x/length, normal_y/length, normal_z/length]
+        self._ensure_splat_channels(len(self.layers))
+        self.layers_dirty = True
+        
+    def remove_layer(self, index: int):
+        """Удалить слой вместе с его каналом весов; следующие слои сдвигаются"""
+        if not 0 <= index < len(self.layers):
+            return
+        self.layers.pop(index)
+        weights = np.delete(self.texture_map, index, axis=2)
+        self.texture_map = np.zeros_like(self.texture_map)
+        self.texture_map[..., :weights.shape[2]] = weights
+        self.layers_dirty = True
+        self.splat_dirty = True
+        
+    def _ensure_splat_channels(self, layer_count: int):
+        """Добавить RGBA-карты весов, если слоев больше, чем каналов"""
+        channels = max(4, (layer_count + 3) // 4 * 4)
+        if self.texture_map.shape[2] < channels:
+            grown = np.zeros((self.height, self.width, channels), dtype=np.uint8)
+            grown[..., :self.texture_map.shape[2]] = self.texture_map
+            self.texture_map = grown
+            self.splat_dirty = True
+            
+    def _ensure_splat_shader(self):
+        if self._splat_shader is None:
+            from .renderer import Shader
+            self._splat_shader = Shader(_SPLAT_VERTEX_SHADER, _SPLAT_FRAGMENT_SHADER)
+            if self._splat_shader.valid:
+                program = self._splat_shader.program
+                self._splat_uniforms = {name: glGetUniformLocation(program, name) for name in
+                                        ("u_layers", "u_weights", "u_layer_count", "u_tiling",
+                                         "u_enabled", "u_light_direction")}
+        return self._splat_shader
+        
+    def _upload_layer_array(self):
+        """Собрать текстуры всех слоев в один GL_TEXTURE_2D_ARRAY"""
+        size = LAYER_TEXTURE_SIZE
+        count = max(len(self.layers), 1)
+        images = np.full((count, size, size, 3), 128, dtype=np.uint8)
+        for i, layer in enumerate(self.layers):
+            images[i] = layer.load_image(size)
+            
+        if self.layer_texture_array is None:
+            self.layer_texture_array = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.layer_texture_array)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGB8, size, size, count, 0, GL_RGB, GL_UNSIGNED_BYTE, images)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glGenerateMipmap(GL_TEXTURE_2D_ARRAY)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+        self.layers_dirty = False
+        
+    def _splat_pages(self, z0: int, z1: int, x0: int, x1: int) -> np.ndarray:
+        """Веса области в раскладке (карты, строки, столбцы, RGBA) для загрузки в массив"""
+        weights = self.texture_map[z0:z1, x0:x1]
+        pages = weights.shape[2] // 4
+        return np.ascontiguousarray(weights.reshape(z1 - z0, x1 - x0, pages, 4).transpose(2, 0, 1, 3))
+        
+    def _upload_splat(self):
+        """Загрузить карты весов целиком или только измененный прямоугольник"""
+        pages = self.texture_map.shape[2] // 4
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        if self.splat_texture is None or self.splat_dirty:
+            if self.splat_texture is None:
+                self.splat_texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D_ARRAY, self.splat_texture)
+            glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA8, self.width, self.height, pages, 0,
+                         GL_RGBA, GL_UNSIGNED_BYTE, self._splat_pages(0, self.height, 0, self.width))
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        else:
+            z0, z1, x0, x1 = self._splat_dirty_rect
+            glBindTexture(GL_TEXTURE_2D_ARRAY, self.splat_texture)
+            glTexSubImage3D(GL_TEXTURE_2D_ARRAY, 0, x0, z0, 0, x1 - x0, z1 - z0, pages,
+                            GL_RGBA, GL_UNSIGNED_BYTE, self._splat_pages(z0, z1, x0, x1))
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+        self.splat_dirty = False
+        self._splat_dirty_rect = None
+        
+    def _bind_splat_material(self) -> bool:
+        """Один набор привязок на весь террейн: шейдер, массив слоев и массив весов"""
+        if self.layers_dirty:
+            self._upload_layer_array()
+        if self.splat_dirty or self._splat_dirty_rect is not None:
+            self._upload_splat()
+            
+        shader = self._ensure_splat_shader()
+        if not shader.valid:
+            return False
+        shader.use()
+        uniforms = self._splat_uniforms
+        count = min(len(self.layers), MAX_TERRAIN_LAYERS)
+        tiling = np.ones(MAX_TERRAIN_LAYERS, dtype=np.float32)
+        enabled = np.zeros(MAX_TERRAIN_LAYERS, dtype=np.float32)
+        for i, layer in enumerate(self.layers[:count]):
+            tiling[i] = layer.tiling
+            enabled[i] = 1.0 if layer.enabled else 0.0
+        glUniform1i(uniforms["u_layers"], 0)
+        glUniform1i(uniforms["u_weights"], 1)
+        glUniform1i(uniforms["u_layer_count"], count)
+        glUniform1fv(uniforms["u_tiling"], MAX_TERRAIN_LAYERS, tiling)
+        glUniform1fv(uniforms["u_enabled"], MAX_TERRAIN_LAYERS, enabled)
+        glUniform3f(uniforms["u_light_direction"], *self.light_direction)
+        
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.layer_texture_array)
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.splat_texture)
+        return True
+        
+    def _unbind_splat_material(self):
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+        glUseProgram(0)
+        
+    def update_normals(self, region=None):
+        """Вычисление нормалей для террейна (целиком или в области [z0, z1, x0, x1])"""
+        if self.normal_map is None or self.normal_map.shape != (self.height, self.width, 3):
+            self.normal_map = np.empty((self.height, self.width, 3), dtype=np.float32)
+            region = None
+        
+        if region is None:
+            z0, z1, x0, x1 = 0, self.height, 0, self.width
+        else:
+            z0, z1, x0, x1 = region
+            
+        # Берем на клетку больше, чтобы внутри области разности были центральными
+        pz0, pz1 = max(z0 - 1, 0), min(z1 + 1, self.height)
+        px0, px1 = max(x0 - 1, 0), min(x1 + 1, self.width)
+        grad_z, grad_x = np.gradient(self.heightmap[pz0:pz1, px0:px1].astype(np.float32, copy=False))
+        inner = (slice(z0 - pz0, z1 - pz0), slice(x0 - px0, x1 - px0))
+        
+        normals = self.normal_map[z0:z1, x0:x1]
+        normals[..., 0] = -grad_x[inner]
+        normals[..., 1] = 1.0  # Вертикальная компонента
+        normals[..., 2] = -grad_z[inner]
+        normals /= np.sqrt(np.einsum('ijk,ijk->ij', normals, normals))[..., None]
+        
+    def _ensure_grid_arrays(self):
+        """Разбить сетку на чанки при смене размеров"""
+        shape = (self.height, self.width, self.chunk_size)
+        if self._grid_shape == shape:
+            return False
+            
+        self._grid_shape = shape
+        size = self.chunk_size
+        self.chunks = []
+        for z0 in range(0, max(self.height - 1, 1), size):
+            row = []
+            for x0 in range(0, max(self.width - 1, 1), size):
+                row.append(TerrainChunk(z0, min(z0 + size, self.height - 1) + 1,
+                                        x0, min(x0 + size, self.width - 1) + 1))
+            self.chunks.append(row)
+        self._dirty_chunks.clear()
+        self._quadtree = self._build_quadtree(0, len(self.chunks), 0, len(self.chunks[0]))
+        
+        # XZ-границы чанков постоянны, высоты обновляются вместе с вершинами
+        r = self.resolution
+        self._chunk_bounds = np.zeros((len(self.chunks), len(self.chunks[0]), 6))
+        for chunk in self.iter_chunks():
+            bounds = self._chunk_bounds[chunk.z0 // size, chunk.x0 // size]
+            bounds[[0, 2, 3, 5]] = chunk.x0 * r, chunk.z0 * r, (chunk.x1 - 1) * r, (chunk.z1 - 1) * r
+        return True
+        
+    def iter_chunks(self):
+        for row in self.chunks:
+            yield from row
+            
+    def _build_quadtree(self, cz0: int, cz1: int, cx0: int, cx1: int) -> TerrainQuadNode:
+        node = TerrainQuadNode(cz0, cz1, cx0, cx1)
+        if cz1 - cz0 == 1 and cx1 - cx0 == 1:
+            node.chunk = self.chunks[cz0][cx0]
+            return node
+        mz = (cz0 + cz1 + 1) // 2 if cz1 - cz0 > 1 else cz1
+        mx = (cx0 + cx1 + 1) // 2 if cx1 - cx0 > 1 else cx1
+        for z0, z1 in ((cz0, mz), (mz, cz1)):
+            for x0, x1 in ((cx0, mx), (mx, cx1)):
+                if z0 < z1 and x0 < x1:
+                    node.children.append(self._build_quadtree(z0, z1, x0, x1))
+        return node
+        
+    def _update_chunk_heights(self, chunk: TerrainChunk):
+        heights = self.heightmap[chunk.z0:chunk.z1, chunk.x0:chunk.x1]
+        bounds = self._chunk_bounds[chunk.z0 // self.chunk_size, chunk.x0 // self.chunk_size]
+        bounds[1] = heights.min()
+        bounds[4] = heights.max()
+        
+    def _refresh_quadtree_bounds(self, node: TerrainQuadNode = None):
+        """Пересчитать AABB узлов снизу вверх по границам чанков"""
+        if node is None:
+            node = self._quadtree
+        if node.chunk is not None:
+            node.bounds = self._chunk_bounds[node.cz0, node.cx0].tolist()
+            return
+        for child in node.children:
+            self._refresh_quadtree_bounds(child)
+        bounds = [child.bounds for child in node.children]
+        node.bounds = [min(b[i] for b in bounds) for i in range(3)] + \
+                      [max(b[i] for b in bounds) for i in range(3, 6)]
+            
+    def collect_visible_chunks(self, frustum: Optional[Frustum]) -> List[TerrainChunk]:
+        """Чанки в пирамиде видимости; узлы целиком внутри не проверяются повторно"""
+        visible = self.visible_chunks
+        visible.clear()
+        if self._quadtree is None:
+            return visible
+        if frustum is None:
+            visible.extend(self.iter_chunks())
+            return visible
+            
+        stack = [(self._quadtree, False)]
+        while stack:
+            node, inside = stack.pop()
+            if not inside:
+                classification = frustum.classify_aabb(node.bounds)
+                if classification == Frustum.OUTSIDE:
+                    continue
+                inside = classification == Frustum.INSIDE
+            if node.chunk is not None:
+                visible.append(node.chunk)
+            else:
+                stack.extend((child, inside) for child in node.children)
+        return visible
+        
+    def select_chunk_lods(self, camera_position, projection_scale: float, viewport_height: float) -> np.ndarray:
+        """Шаг сетки каждого чанка (nz, nx): квад не мельче lod_pixel_error пикселей на экране"""
+        camera = np.asarray(camera_position, dtype=np.float64)
+        bounds = self._chunk_bounds
+        nearest = np.clip(camera, bounds[..., :3], bounds[..., 3:])
+        distances = np.maximum(np.linalg.norm(nearest - camera, axis=-1), 1e-6)
+        
+        # Экранный размер квада с шагом 1 в пикселях
+        quad_pixels = self.resolution * projection_scale * viewport_height * 0.5 / distances
+        levels = np.floor(np.log2(np.maximum(self.lod_pixel_error / quad_pixels, 1.0)))
+        max_level = int(np.log2(max(self.chunk_size, 1)))
+        steps = np.left_shift(1, np.clip(levels, 0, max_level).astype(int))
+        for chunk in self.iter_chunks():
+            chunk.lod_step = int(steps[chunk.z0 // self.chunk_size, chunk.x0 // self.chunk_size])
+        return steps
+        
+    def _lod_index_buffer(self, key):
+        entry = self._lod_index_buffers.get(key)
+        if entry is None:
+            rows, cols, step = key[:3]
+            indices = _compact_lod_indices(_lod_grid_indices(rows, cols, step, key[3:]), rows, cols, step)
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            entry = (buffer, len(indices))
+            self._lod_index_buffers[key] = entry
+        return entry
+            
+    def _chunk_vertex_data(self, chunk: TerrainChunk, step: int, row_start: int = 0,
+                           row_end: Optional[int] = None) -> np.ndarray:
+        """Вершины чанка, прореженного с шагом step (строки [row_start, row_end) прореженной сетки)"""
+        zs = _lod_positions(chunk.z1 - chunk.z0, step)[row_start:row_end] + chunk.z0
+        xs = _lod_positions(chunk.x1 - chunk.x0, step) + chunk.x0
+        
+        data = np.empty((len(zs), len(xs), _CHUNK_VERTEX_FLOATS), dtype=np.float32)
+        data[..., 0] = xs[None, :] * self.resolution
+        data[..., 1] = self.heightmap[np.ix_(zs, xs)]
+        data[..., 2] = zs[:, None] * self.resolution
+        data[..., 3:6] = self.normal_map[np.ix_(zs, xs)]
+        data[..., 6] = xs[None, :] / max(self.width - 1, 1)
+        data[..., 7] = zs[:, None] / max(self.height - 1, 1)
+        return data.reshape(-1, _CHUNK_VERTEX_FLOATS)
+        
+    def _chunk_lod_buffer(self, chunk: TerrainChunk, step: int):
+        """VBO чанка для шага step; создается при первом обращении"""
+        key = (chunk, step)
+        entry = self._resident_buffers.get(key)
+        if entry is not None:
+            entry[1] = self._frame_index
+            self._resident_buffers.move_to_end(key)
+            return chunk.lod_buffers[step]
+            
+        data = self._chunk_vertex_data(chunk, step)
+        buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, buffer)
+        glBufferData(GL_ARRAY_BUFFER, data, GL_DYNAMIC_DRAW)
+        chunk.lod_buffers[step] = buffer
+        self._resident_buffers[key] = [data.nbytes, self._frame_index]
+        self.resident_buffer_bytes += data.nbytes
+        return buffer
+        
+    def _evict_chunk_buffers(self):
+        """Удалить самые давние буферы сверх бюджета; нарисованные в этом кадре остаются"""
+        budget = self.chunk_buffer_budget_mb * 1024 * 1024
+        resident = self._resident_buffers
+        while self.resident_buffer_bytes > budget and resident:
+            (chunk, step), (nbytes, frame) = next(iter(resident.items()))
+            if frame == self._frame_index:
+                break
+            del resident[(chunk, step)]
+            glDeleteBuffers(1, [chunk.lod_buffers.pop(step)])
+            self.resident_buffer_bytes -= nbytes
+            
+    def _release_chunk_buffers(self):
+        for chunk, step in self._resident_buffers:
+            glDeleteBuffers(1, [chunk.lod_buffers.pop(step)])
+        self._resident_buffers.clear()
+        self.resident_buffer_bytes = 0
+        
+    def mark_dirty(self, z0: int, z1: int, x0: int, x1: int):
+        """Отметить измененные клетки высот [z0, z1) x [x0, x1) для частичного обновления"""
+        if self._height_pyramid is not None:
+            self._update_height_pyramid(z0, z1, x0, x1)
+        if self.dirty or not self.chunks:
+            self.dirty = True
+            return
+            
+        # Нормали меняются и в соседних клетках
+        z0, z1 = max(z0 - 1, 0), min(z1 + 1, self.height)
+        x0, x1 = max(x0 - 1, 0), min(x1 + 1, self.width)
+        if z0 >= z1 or x0 >= x1:
+            return
+            
+        size = self.chunk_size
+        for cz in range(max(z0 // size - 1, 0), min((z1 - 1) // size + 1, len(self.chunks))):
+            for cx in range(max(x0 // size - 1, 0), min((x1 - 1) // size + 1, len(self.chunks[cz]))):
+                chunk = self.chunks[cz][cx]
+                if chunk.mark_dirty(z0, z1, x0, x1):
+                    self._dirty_chunks.add(chunk)
         
     def build_mesh(self):
-        """Построение mesh для террейна"""
+        """Полный пересчет: нормали, разбиение на чанки и их границы.
+
+        Вершинные буферы сбрасываются и создаются заново при отрисовке,
+        только для видимых чанков.
+        """
         if not self.dirty:
             return
             
         self.update_normals()
-        
-        vertices = []
-        normals = []
-        uvs = []
-        indices = []
-        
-        # Генерация вершин
-        for z in range(self.height):
-            for x in range(self.width):
-                # Позиция вершины
-                y = self.heightmap[z][x]
-                vertices.extend([x * self.resolution, y, z * self.resolution])
-                
-                # Нормаль
-                normal = self.normal_map[z][x] if self.normal_map is not None else [0, 1, 0]
-                normals.extend(normal)
-                
-                # UV координаты
-                uvs.extend([x / (self.width - 1), z / (self.height - 1)])
-        
-        # Генерация индексов
-        for z in range(self.height - 1):
-            for x in range(self.width - 1):
-                # Два треугольника на квад
-                i0 = z * self.width + x
-                i1 = z * self.width + x + 1
-                i2 = (z + 1) * self.width + x
-                i3 = (z + 1) * self.width + x + 1
-                
-                indices.extend([i0, i1, i2])  # Первый треугольник
-                indices.extend([i2, i1, i3])  # Второй треугольник
-        
-        # Создание OpenGL буферов
-        if self.vertex_buffer is None:
-            self.vertex_buffer = glGenBuffers(1)
-            self.normal_buffer = glGenBuffers(1)
-            self.uv_buffer = glGenBuffers(1)
-            self.index_buffer = glGenBuffers(1)
-        
-        # Заполнение буферов
-        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
-        glBufferData(GL_ARRAY_BUFFER, np.array(vertices, dtype=np.float32), GL_STATIC_DRAW)
-        
-        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
-        glBufferData(GL_ARRAY_BUFFER, np.array(normals, dtype=np.float32), GL_STATIC_DRAW)
-        
-        glBindBuffer(GL_ARRAY_BUFFER, self.uv_buffer)
-        glBufferData(GL_ARRAY_BUFFER, np.array(uvs, dtype=np.float32), GL_STATIC_DRAW)
-        
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, np.array(indices, dtype=np.uint32), GL_STATIC_DRAW)
-        
+        self._release_chunk_buffers()
+        self._ensure_grid_arrays()
+        
+        for chunk in self.iter_chunks():
+            self._update_chunk_heights(chunk)
+            chunk.dirty_rect = None
+        self._dirty_chunks.clear()
+        self._refresh_quadtree_bounds()
         self.dirty = False
         
-    def draw(self):
-        """Отрисовка террейна"""
+    def update_dirty_chunks(self):
+        """Пересчитать нормали и догрузить в GPU только измененные строки загруженных буферов"""
+        for chunk in self._dirty_chunks:
+            z0, z1, x0, x1 = chunk.dirty_rect
+            chunk.dirty_rect = None
+            self.update_normals((z0, z1, x0, x1))
+            self._update_chunk_heights(chunk)
+            
+            for step, buffer in chunk.lod_buffers.items():
+                zs = _lod_positions(chunk.z1 - chunk.z0, step) + chunk.z0
+                row_start, row_end = np.searchsorted(zs, z0), np.searchsorted(zs, z1)
+                if row_start >= row_end:
+                    continue
+                data = self._chunk_vertex_data(chunk, step, row_start, row_end)
+                offset = int(row_start) * len(_lod_positions(chunk.x1 - chunk.x0, step)) * _CHUNK_VERTEX_STRIDE
+                glBindBuffer(GL_ARRAY_BUFFER, buffer)
+                glBufferSubData(GL_ARRAY_BUFFER, offset, data.nbytes, data)
+        self._dirty_chunks.clear()
+        self._refresh_quadtree_bounds()
+        
+    def draw(self, camera_position=None, frustum: Optional[Frustum] = None,
+             projection_scale: Optional[float] = None, viewport_height: float = 720.0):
+        """Отрисовка террейна.
+
+        С camera_position рисуются только видимые чанки, каждый со своим шагом сетки
+        по расстоянию до камеры; без камеры - вся сетка в полном разрешении.
+        В видеопамяти лежат вершины только тех чанков и шагов, что рисовались недавно.
+        """
         if self.dirty:
             self.build_mesh()
+        elif self._dirty_chunks:
+            self.update_dirty_chunks()
             
-        if self.vertex_buffer is None:
+        if not self.chunks:
             return
+        self._frame_index += 1
             
-        # Включаем текстуры слоев
-        for i, layer in enumerate(self.layers):
-            if layer.enabled and layer.texture_id:
-                glActiveTexture(GL_TEXTURE0 + i)
-                glBindTexture(GL_TEXTURE_2D, layer.texture_id)
+        material_bound = self._bind_splat_material()
         
         # Рисуем mesh
         glEnableClientState(GL_VERTEX_ARRAY)
         glEnableClientState(GL_NORMAL_ARRAY)
         glEnableClientState(GL_TEXTURE_COORD_ARRAY)
         
-        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
-        glVertexPointer(3, GL_FLOAT, 0, None)
-        
-        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
-        glNormalPointer(GL_FLOAT, 0, None)
-        
-        glBindBuffer(GL_ARRAY_BUFFER, self.uv_buffer)
-        glTexCoordPointer(2, GL_FLOAT, 0, None)
-        
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
-        glDrawElements(GL_TRIANGLES, (self.width - 1) * (self.height - 1) * 6, GL_UNSIGNED_INT, None)
+        if camera_position is None:
+            steps = np.ones((len(self.chunks), len(self.chunks[0])), dtype=int)
+            for chunk in self.iter_chunks():
+                chunk.lod_step = 1
+            self._draw_chunks(list(self.iter_chunks()), steps)
+        else:
+            self._draw_chunk_lods(camera_position, frustum, projection_scale, viewport_height)
         
         glDisableClientState(GL_VERTEX_ARRAY)
         glDisableClientState(GL_NORMAL_ARRAY)
         glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
         
-        # Отключаем текстуры
-        for i in range(len(self.layers)):
-            glActiveTexture(GL_TEXTURE0 + i)
-            glBindTexture(GL_TEXTURE_2D, 0)
+        if material_bound:
+            self._unbind_splat_material()
+        self._evict_chunk_buffers()
+            
+    def _draw_chunk_lods(self, camera_position, frustum, projection_scale, viewport_height):
+        if projection_scale is None:
+            projection_scale = 1.0 / np.tan(np.radians(30.0))
+        steps = self.select_chunk_lods(camera_position, projection_scale, viewport_height)
+        self._draw_chunks(self.collect_visible_chunks(frustum), steps)
+        
+    def _draw_chunks(self, chunks: List[TerrainChunk], steps: np.ndarray):
+        # Сторона шьется к шагу соседа, если он грубее
+        neighbors = np.pad(steps, 1)
+        edges = np.stack([np.maximum(steps, neighbors[:-2, 1:-1]), np.maximum(steps, neighbors[2:, 1:-1]),
+                          np.maximum(steps, neighbors[1:-1, :-2]), np.maximum(steps, neighbors[1:-1, 2:])],
+                         axis=-1)
+        
+        normal_offset = ctypes.c_void_p(12)
+        uv_offset = ctypes.c_void_p(24)
+        triangles = 0
+        for chunk in chunks:
+            cz, cx = chunk.z0 // self.chunk_size, chunk.x0 // self.chunk_size
+            glBindBuffer(GL_ARRAY_BUFFER, self._chunk_lod_buffer(chunk, chunk.lod_step))
+            glVertexPointer(3, GL_FLOAT, _CHUNK_VERTEX_STRIDE, None)
+            glNormalPointer(GL_FLOAT, _CHUNK_VERTEX_STRIDE, normal_offset)
+            glTexCoordPointer(2, GL_FLOAT, _CHUNK_VERTEX_STRIDE, uv_offset)
+            
+            key = (chunk.z1 - chunk.z0, chunk.x1 - chunk.x0, chunk.lod_step) + tuple(int(e) for e in edges[cz, cx])
+            buffer, count = self._lod_index_buffer(key)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffer)
+            glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, None)
+            triangles += count // 3
+        self.drawn_triangles = triangles
             
     def apply_brush(self, brush: TerrainBrush, position: Tuple[float, float]):
-        """Применение кисти к террейну"""
+        """Применение кисти к террейну (векторно по окну кисти)"""
         center_x, center_z = position
         center_x /= self.resolution
         center_z /= self.resolution
@@ -248,48 +835,98 @@ class Terrain:
         brush_size = int(brush.size / self.resolution)
         brush_strength = brush.strength * 0.1
         
-        for dz in range(-brush_size, brush_size + 1):
-            for dx in range(-brush_size, brush_size + 1):
-                x = int(center_x + dx)
-                z = int(center_z + dz)
-                
-                if 0 <= x < self.width and 0 <= z < self.height:
-                    # Расстояние от центра кисти
-                    distance = np.sqrt(dx**2 + dz**2) / brush_size
-                    if distance > 1.0:
-                        continue
-                        
-                    # Коэффициент влияния (с falloff)
-                    influence = 1.0 - distance
-                    influence = pow(influence, 1.0 / max(0.1, brush.falloff))
-                    influence *= brush_strength
-                    
-                    # Применяем эффект в зависимости от типа кисти
-                    if brush.brush_type == TerrainBrushType.RAISE:
-                        self.heightmap[z][x] += influence
-                    elif brush.brush_type == TerrainBrushType.LOWER:
-                        self.heightmap[z][x] -= influence
-                    elif brush.brush_type == TerrainBrushType.SMOOTH:
-                        # Сглаживание - усреднение с соседями
-                        neighbors = 0
-                        total = 0
-                        for nz in range(max(0, z-1), min(self.height, z+2)):
-                            for nx in range(max(0, x-1), min(self.width, x+2)):
-                                if nz != z or nx != x:
-                                    neighbors += 1
-                                    total += self.heightmap[nz][nx]
-                        if neighbors > 0:
-                            average = total / neighbors
-                            self.heightmap[z][x] += (average - self.heightmap[z][x]) * influence
-                    elif brush.brush_type == TerrainBrushType.FLATTEN:
-                        # Выравнивание к заданной высоте
-                        target_height = 0.5  # Можно сделать настраиваемым
-                        self.heightmap[z][x] += (target_height - self.heightmap[z][x]) * influence
-                    
-                    # Ограничиваем высоты
-                    self.heightmap[z][x] = max(0.0, min(1.0, self.heightmap[z][x]))
-        
-        self.dirty = True
+        # Окно кисти, обрезанное по границам террейна
+        cell_x, cell_z = int(np.floor(center_x)), int(np.floor(center_z))
+        x0, x1 = max(cell_x - brush_size, 0), min(cell_x + brush_size + 1, self.width)
+        z0, z1 = max(cell_z - brush_size, 0), min(cell_z + brush_size + 1, self.height)
+        if x0 >= x1 or z0 >= z1:
+            return
+            
+        # Коэффициент влияния (с falloff) по расстоянию от центра кисти
+        dx = np.arange(x0, x1, dtype=np.float32) - cell_x
+        dz = np.arange(z0, z1, dtype=np.float32) - cell_z
+        distance = np.sqrt(dz[:, None] ** 2 + dx[None, :] ** 2) / max(brush_size, 1)
+        influence = np.power(np.clip(1.0 - distance, 0.0, None), 1.0 / max(0.1, brush.falloff))
+        influence *= brush_strength
+        
+        # Вызов вне штриха записывается в историю как отдельный штрих
+        own_stroke = not self.history.recording
+        if own_stroke:
+            self.history.begin_stroke(brush.brush_type.value)
+        self.history.record_region(z0, z1, x0, x1)
+        
+        if brush.brush_type == TerrainBrushType.TEXTURE:
+            self._apply_texture_brush(brush.texture_index, influence, z0, z1, x0, x1)
+        else:
+            self._apply_height_brush(brush, influence, z0, z1, x0, x1)
+            
+        if own_stroke:
+            self.history.end_stroke()
+            
+    def _apply_height_brush(self, brush: TerrainBrush, influence: np.ndarray,
+                            z0: int, z1: int, x0: int, x1: int):
+        window = self.heightmap[z0:z1, x0:x1]
+        if brush.brush_type == TerrainBrushType.RAISE:
+            window += influence
+        elif brush.brush_type == TerrainBrushType.LOWER:
+            window -= influence
+        elif brush.brush_type == TerrainBrushType.SMOOTH:
+            # Сглаживание - усреднение с соседями
+            average = self._neighbor_average(z0, z1, x0, x1)
+            window += (average - window) * influence
+        elif brush.brush_type == TerrainBrushType.FLATTEN:
+            # Выравнивание к заданной высоте
+            target_height = 0.5  # Можно сделать настраиваемым
+            window += (target_height - window) * influence
+        
+        # Ограничиваем высоты
+        np.clip(window, 0.0, 1.0, out=window)
+        
+        self.mark_dirty(z0, z1, x0, x1)
+        
+    def _neighbor_average(self, z0: int, z1: int, x0: int, x1: int) -> np.ndarray:
+        """Среднее 8 соседей каждой клетки окна (разделимый box-фильтр 3x3, с учетом краев)"""
+        pz0, pz1 = max(z0 - 1, 0), min(z1 + 1, self.height)
+        px0, px1 = max(x0 - 1, 0), min(x1 + 1, self.width)
+        
+        # Дополняем нулями там, где окно упирается в край террейна
+        values = np.zeros((z1 - z0 + 2, x1 - x0 + 2), dtype=np.float32)
+        counts = np.zeros_like(values)
+        oz, ox = pz0 - (z0 - 1), px0 - (x0 - 1)
+        values[oz:oz + pz1 - pz0, ox:ox + px1 - px0] = self.heightmap[pz0:pz1, px0:px1]
+        counts[oz:oz + pz1 - pz0, ox:ox + px1 - px0] = 1.0
+        
+        def box3(a):
+            rows = a[:-2] + a[1:-1] + a[2:]
+            return rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]
+            
+        center = values[1:-1, 1:-1]
+        total = box3(values) - center
+        neighbors = box3(counts) - 1.0
+        return np.where(neighbors > 0, total / np.maximum(neighbors, 1.0), center)
+        
+    def _apply_texture_brush(self, layer_index: int, influence: np.ndarray,
+                             z0: int, z1: int, x0: int, x1: int):
+        """Подмешать вес слоя layer_index в splat-карту с сохранением суммы весов"""
+        if not 0 <= layer_index < self.texture_map.shape[2]:
+            return
+            
+        weights = self.texture_map[z0:z1, x0:x1].astype(np.float32)
+        strength = np.clip(influence, 0.0, 1.0)[..., None]
+        weights *= 1.0 - strength
+        weights[..., layer_index] += strength[..., 0] * 255.0
+        
+        # Сумма весов нормируется к 255 и квантуется обратно в uint8
+        total = weights.sum(axis=2, keepdims=True)
+        np.multiply(weights, 255.0 / np.maximum(total, 1e-6), out=weights, where=total > 0)
+        self.texture_map[z0:z1, x0:x1] = np.rint(weights).astype(np.uint8)
+        self.mark_splat_dirty(z0, z1, x0, x1)
+        
+    def mark_splat_dirty(self, z0: int, z1: int, x0: int, x1: int):
+        """Отметить измененные веса [z0, z1) x [x0, x1) для частичной загрузки в GPU"""
+        rect = self._splat_dirty_rect
+        self._splat_dirty_rect = [z0, z1, x0, x1] if rect is None else \
+            [min(rect[0], z0), max(rect[1], z1), min(rect[2], x0), max(rect[3], x1)]
         
     def get_height_at(self, x: float, z: float) -> float:
         """Получить высоту в точке"""
@@ -319,6 +956,133 @@ class Terrain:
         
         # Интерполяция по Z
         return h1 * (1 - dz) + h2 * dz
+        
+    def _bilinear_cells(self, points):
+        """Клетки и доли билинейной интерполяции для точек (N, 2) по (x, z), зажатых в карту"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        grid_x = np.clip(points[:, 0] / self.resolution, 0.0, self.width - 1)
+        grid_z = np.clip(points[:, 1] / self.resolution, 0.0, self.height - 1)
+        x0 = np.minimum(grid_x.astype(np.intp), self.width - 2)
+        z0 = np.minimum(grid_z.astype(np.intp), self.height - 2)
+        return z0, x0, grid_x - x0, grid_z - z0
+        
+    def sample_heights(self, points) -> np.ndarray:
+        """Высоты в точках (N, 2) по (x, z); за краем карты берется высота края"""
+        z0, x0, dx, dz = self._bilinear_cells(points)
+        h = self.heightmap
+        top = h[z0, x0] * (1.0 - dx) + h[z0, x0 + 1] * dx
+        bottom = h[z0 + 1, x0] * (1.0 - dx) + h[z0 + 1, x0 + 1] * dx
+        return top * (1.0 - dz) + bottom * dz
+        
+    def sample_normals(self, points) -> np.ndarray:
+        """Нормали (N, 3) в точках (N, 2) по центральным разностям высот, как в update_normals"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        step = self.resolution
+        offsets = np.array([[step, 0.0], [-step, 0.0], [0.0, step], [0.0, -step]])
+        heights = self.sample_heights((points[:, None, :] + offsets[None, :, :]).reshape(-1, 2)).reshape(-1, 4)
+        normals = np.empty((len(points), 3))
+        normals[:, 0] = -(heights[:, 0] - heights[:, 1]) * 0.5
+        normals[:, 1] = 1.0
+        normals[:, 2] = -(heights[:, 2] - heights[:, 3]) * 0.5
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        return normals
+        
+    def _build_height_pyramid(self):
+        shape = (max(self.height - 1, 1), max(self.width - 1, 1))
+        levels = []
+        while True:
+            levels.append((np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32)))
+            if shape == (1, 1):
+                break
+            shape = ((shape[0] + 1) // 2, (shape[1] + 1) // 2)
+        self._height_pyramid = levels
+        self._update_height_pyramid(0, self.height, 0, self.width)
+        
+    def _update_height_pyramid(self, z0: int, z1: int, x0: int, x1: int):
+        """Пересчитать min/max клеток, касающихся вершин [z0, z1) x [x0, x1), и их предков"""
+        levels = self._height_pyramid
+        low, high = levels[0]
+        r0, r1 = max(z0 - 1, 0), min(z1, low.shape[0])
+        c0, c1 = max(x0 - 1, 0), min(x1, low.shape[1])
+        if r0 >= r1 or c0 >= c1:
+            return
+        h = self.heightmap[r0:r1 + 1, c0:c1 + 1]
+        corners = (h[:-1, :-1], h[:-1, 1:], h[1:, :-1], h[1:, 1:])
+        low[r0:r1, c0:c1] = np.minimum.reduce(corners)
+        high[r0:r1, c0:c1] = np.maximum.reduce(corners)
+        
+        for (child_low, child_high), (low, high) in zip(levels, levels[1:]):
+            r0, r1 = r0 // 2, (r1 + 1) // 2
+            c0, c1 = c0 // 2, (c1 + 1) // 2
+            low[r0:r1, c0:c1] = _reduce_blocks(child_low[2 * r0:2 * r1, 2 * c0:2 * c1], np.minimum)
+            high[r0:r1, c0:c1] = _reduce_blocks(child_high[2 * r0:2 * r1, 2 * c0:2 * c1], np.maximum)
+            
+    def raycast(self, origin, direction, max_distance=1000.0):
+        """Пересечение луча с поверхностью террейна: (точка или None, расстояние).
+
+        Узлы пирамиды min/max обходятся в порядке входа луча; узел, который луч
+        проходит выше максимума или ниже минимума высот, отбрасывается целиком.
+        """
+        if self.width < 2 or self.height < 2:
+            return None, max_distance
+        if self._height_pyramid is None:
+            self._build_height_pyramid()
+            
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        length = np.linalg.norm(direction)
+        if length < 1e-12:
+            return None, max_distance
+        direction = direction / length
+        safe = np.where(np.abs(direction) < 1e-12, 1e-12, direction)
+        origin_tuple = tuple(origin.tolist())
+        inverse = tuple((1.0 / safe).tolist())
+        
+        levels = self._height_pyramid
+        r = self.resolution
+        cells_z, cells_x = levels[0][0].shape
+        
+        def node_entry(level, row, col, t_max):
+            low, high = levels[level]
+            size = 1 << level
+            return _ray_box(origin_tuple, inverse,
+                            (col * size * r, float(low[row, col]), row * size * r),
+                            (min((col + 1) * size, cells_x) * r, float(high[row, col]),
+                             min((row + 1) * size, cells_z) * r),
+                            t_max)
+        
+        best = max_distance
+        hit = None
+        top = len(levels) - 1
+        t_root = node_entry(top, 0, 0, best)
+        heap = [] if t_root is None else [(t_root, top, 0, 0)]
+        h = self.heightmap
+        while heap:
+            t_enter, level, row, col = heapq.heappop(heap)
+            if t_enter >= best:
+                break
+            if level == 0:
+                p00 = np.array([col * r, h[row, col], row * r])
+                p10 = np.array([(col + 1) * r, h[row, col + 1], row * r])
+                p01 = np.array([col * r, h[row + 1, col], (row + 1) * r])
+                p11 = np.array([(col + 1) * r, h[row + 1, col + 1], (row + 1) * r])
+                # Те же треугольники, что и в сетке: (p00, p10, p01) и (p01, p10, p11)
+                for triangle in ((p00, p10, p01), (p01, p10, p11)):
+                    t = _ray_triangle(origin, direction, *triangle)
+                    if t is not None and t < best:
+                        best = t
+                        hit = origin + direction * t
+                continue
+                
+            child_shape = levels[level - 1][0].shape
+            for child_row in (2 * row, 2 * row + 1):
+                for child_col in (2 * col, 2 * col + 1):
+                    if child_row < child_shape[0] and child_col < child_shape[1]:
+                        t_child = node_entry(level - 1, child_row, child_col, best)
+                        if t_child is not None:
+                            heapq.heappush(heap, (t_child, level - 1, child_row, child_col))
+                            
+        return hit, best
 
 class TerrainEditor(QWidget):
     """Редактор террейна"""
@@ -469,7 +1233,7 @@ class TerrainEditor(QWidget):
     def remove_layer(self):
         current_row = self.layers_list.currentRow()
         if current_row >= 0 and current_row < len(self.terrain.layers):
-            self.terrain.layers.pop(current_row)
+            self.terrain.remove_layer(current_row)
             self.update_layers_list()
             
     def update_layers_list(self):
@@ -492,8 +1256,13 @@ class TerrainEditor(QWidget):
         self.terrain.generate_perlin_noise()
         
     def reset_terrain(self):
-        self.terrain.heightmap = np.zeros((self.terrain.height, self.terrain.width), dtype=np.float32)
-        self.terrain.dirty = True
+        # Сброс выполняется на месте и отменяется как обычный штрих
+        terrain = self.terrain
+        terrain.history.begin_stroke("Reset")
+        terrain.history.record_region(0, terrain.height, 0, terrain.width)
+        terrain.heightmap.fill(0.0)
+        terrain.history.end_stroke()
+        terrain.mark_dirty(0, terrain.height, 0, terrain.width)
 
 class TerrainPlugin(Plugin):
     """Плагин системы террейна"""
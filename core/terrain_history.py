@@ -0,0 +1,154 @@
+import zlib
+from collections import deque
+import numpy as np
+
+class TerrainStroke:
+    """Запись истории: сжатые XOR-дельты измененных тайлов.
+
+    XOR текущего состояния с дельтой дает состояние до правки, повторный XOR -
+    состояние после, поэтому одна дельта обслуживает и undo, и redo.
+    Неизмененные ячейки тайла дают нули, которые почти не занимают места.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.tiles = []  # [(tz, tx, сжатая дельта высот, сжатая дельта весов)]
+        self.nbytes = 0
+
+class TerrainHistory:
+    """Ограниченная по памяти история правок террейна по тайлам.
+
+    Перед изменением области кисть вызывает record_region: тайлы, которых еще
+    не касался текущий штрих, копируются. В end_stroke для них считаются
+    дельты; тайлы без изменений не сохраняются. Undo/redo восстанавливает
+    только эти тайлы и помечает грязными только их чанки.
+    """
+
+    def __init__(self, terrain, tile_size=32, max_bytes=32 * 1024 * 1024):
+        self.terrain = terrain
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.memory_used = 0
+        self._stroke = None
+        self._before = {}  # (tz, tx) -> (высоты, веса) до правки
+        self._shape = None
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    @property
+    def recording(self):
+        return self._stroke is not None
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.memory_used = 0
+        self._stroke = None
+        self._before = {}
+
+    def _check_shape(self):
+        # Смена размеров или числа слоев делает дельты неприменимыми
+        shape = (self.terrain.heightmap.shape, self.terrain.texture_map.shape)
+        if shape != self._shape:
+            self.clear()
+            self._shape = shape
+
+    def _tile_slices(self, tz, tx):
+        size = self.tile_size
+        return slice(tz * size, (tz + 1) * size), slice(tx * size, (tx + 1) * size)
+
+    def begin_stroke(self, name="Brush"):
+        self._check_shape()
+        self._stroke = TerrainStroke(name)
+        self._before = {}
+
+    def record_region(self, z0, z1, x0, x1):
+        """Сохранить исходное состояние тайлов области [z0, z1) x [x0, x1) до ее изменения"""
+        if self._stroke is None:
+            return
+        size = self.tile_size
+        terrain = self.terrain
+        for tz in range(z0 // size, (z1 - 1) // size + 1):
+            for tx in range(x0 // size, (x1 - 1) // size + 1):
+                if (tz, tx) not in self._before:
+                    rows, cols = self._tile_slices(tz, tx)
+                    self._before[(tz, tx)] = (terrain.heightmap[rows, cols].copy(),
+                                              terrain.texture_map[rows, cols].copy())
+
+    def end_stroke(self):
+        """Завершить штрих; возвращает запись или None, если ничего не изменилось"""
+        stroke, self._stroke = self._stroke, None
+        if stroke is None:
+            return None
+
+        terrain = self.terrain
+        for (tz, tx), (heights, weights) in self._before.items():
+            rows, cols = self._tile_slices(tz, tx)
+            height_delta = heights.view(np.uint32) ^ terrain.heightmap[rows, cols].view(np.uint32)
+            weight_delta = weights ^ terrain.texture_map[rows, cols]
+            if not height_delta.any() and not weight_delta.any():
+                continue
+            packed_heights = zlib.compress(height_delta.tobytes(), 1)
+            packed_weights = zlib.compress(weight_delta.tobytes(), 1)
+            stroke.tiles.append((tz, tx, packed_heights, packed_weights))
+            stroke.nbytes += len(packed_heights) + len(packed_weights)
+        self._before = {}
+
+        if not stroke.tiles:
+            return None
+        self.redo_stack.clear()
+        self.undo_stack.append(stroke)
+        self.memory_used = sum(record.nbytes for record in self.undo_stack)
+        # Самые старые записи вытесняются; последняя остается даже сверх лимита
+        while self.memory_used > self.max_bytes and len(self.undo_stack) > 1:
+            self.memory_used -= self.undo_stack.popleft().nbytes
+        return stroke
+
+    def _apply(self, stroke):
+        terrain = self.terrain
+        for tz, tx, packed_heights, packed_weights in stroke.tiles:
+            rows, cols = self._tile_slices(tz, tx)
+            heights = terrain.heightmap[rows, cols]
+            weights = terrain.texture_map[rows, cols]
+            height_delta = np.frombuffer(zlib.decompress(packed_heights), dtype=np.uint32).reshape(heights.shape)
+            weight_delta = np.frombuffer(zlib.decompress(packed_weights), dtype=np.uint8).reshape(weights.shape)
+            heights.view(np.uint32)[...] ^= height_delta
+            weights[...] ^= weight_delta
+
+            z0, x0 = rows.start, cols.start
+            z1, x1 = z0 + heights.shape[0], x0 + heights.shape[1]
+            if height_delta.any():
+                terrain.mark_dirty(z0, z1, x0, x1)
+            if weight_delta.any():
+                terrain.mark_splat_dirty(z0, z1, x0, x1)
+
+    def undo(self):
+        """Отменить последний штрих; возвращает его запись или None"""
+        if self._stroke is not None:
+            self.end_stroke()
+        self._check_shape()
+        if not self.undo_stack:
+            return None
+        stroke = self.undo_stack.pop()
+        self.memory_used -= stroke.nbytes
+        self._apply(stroke)
+        self.redo_stack.append(stroke)
+        return stroke
+
+    def redo(self):
+        """Повторить отмененный штрих; возвращает его запись или None"""
+        self._check_shape()
+        if not self.redo_stack:
+            return None
+        stroke = self.redo_stack.pop()
+        self._apply(stroke)
+        self.undo_stack.append(stroke)
+        self.memory_used += stroke.nbytes
+        return stroke
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Градиенты шума Перлина в 2D (8 направлений)
+_GRADIENTS = np.array([
+    [1.0, 1.0], [-1.0, 1.0], [1.0, -1.0], [-1.0, -1.0],
+    [1.0, 0.0], [-1.0, 0.0], [0.0, 1.0], [0.0, -1.0],
+])
+
+def permutation_table(base=0):
+    """Таблица перестановок на 512 элементов для заданного seed"""
+    perm = np.random.RandomState(base).permutation(256)
+    return np.concatenate([perm, perm])
+
+def _fade(t):
+    return t * t * t * (t * (t * 6.0 - 15.0) + 10.0)
+
+def perlin2(x, y, perm, repeat_x=0, repeat_y=0):
+    """Градиентный шум Перлина над массивами координат (любой формы)"""
+    xi = np.floor(x).astype(np.int64)
+    yi = np.floor(y).astype(np.int64)
+    xf = x - xi
+    yf = y - yi
+
+    xi1 = xi + 1
+    yi1 = yi + 1
+    if repeat_x:
+        xi, xi1 = xi % repeat_x, xi1 % repeat_x
+    if repeat_y:
+        yi, yi1 = yi % repeat_y, yi1 % repeat_y
+    xi, xi1, yi, yi1 = xi & 255, xi1 & 255, yi & 255, yi1 & 255
+
+    def corner(cx, cy, dx, dy):
+        gradient = _GRADIENTS[perm[perm[cx] + cy] & 7]
+        return gradient[..., 0] * dx + gradient[..., 1] * dy
+
+    n00 = corner(xi, yi, xf, yf)
+    n10 = corner(xi1, yi, xf - 1.0, yf)
+    n01 = corner(xi, yi1, xf, yf - 1.0)
+    n11 = corner(xi1, yi1, xf - 1.0, yf - 1.0)
+
+    u = _fade(xf)
+    v = _fade(yf)
+    nx0 = n00 + u * (n10 - n00)
+    nx1 = n01 + u * (n11 - n01)
+    return nx0 + v * (nx1 - nx0)
+
+def fbm2(x, y, octaves=6, persistence=0.5, lacunarity=2.0, repeat=0.0, base=0):
+    """Фрактальный шум (fBm): сумма октав Перлина, нормированная на сумму амплитуд"""
+    perm = permutation_table(base)
+    total = np.zeros(np.broadcast(x, y).shape)
+    frequency = 1.0
+    amplitude = 1.0
+    max_amplitude = 0.0
+    for _ in range(octaves):
+        period = int(round(repeat * frequency)) if repeat else 0
+        total += amplitude * perlin2(x * frequency, y * frequency, perm, period, period)
+        max_amplitude += amplitude
+        amplitude *= persistence
+        frequency *= lacunarity
+    return total / max_amplitude
+
+def _fbm_tile(args):
+    row_start, row_end, width, height, scale, octaves, persistence, lacunarity, base = args
+    world_x = np.linspace(0, scale, width)
+    world_y = np.linspace(0, scale, height)[row_start:row_end]
+    return fbm2(world_x[None, :], world_y[:, None], octaves, persistence, lacunarity, scale, base)
+
+def generate_fbm_heightmap(width, height, scale=50.0, octaves=6, persistence=0.5,
+                           lacunarity=2.0, base=42, tile_rows=256, workers=None):
+    """Карта высот (height, width) из fBm-шума, нормированная в [0, 1].
+
+    Карта считается полосами по tile_rows строк, чтобы временные массивы не росли
+    с размером карты. При workers > 1 полосы считаются в пуле процессов.
+    """
+    heightmap = np.empty((height, width), dtype=np.float32)
+    tiles = [(start, min(start + tile_rows, height), width, height, scale,
+              octaves, persistence, lacunarity, base)
+             for start in range(0, height, tile_rows)]
+
+    if workers is None:
+        workers = 1
+    elif workers <= 0:
+        workers = os.cpu_count() or 1
+
+    if workers > 1 and len(tiles) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for tile, values in zip(tiles, executor.map(_fbm_tile, tiles)):
+                heightmap[tile[0]:tile[1]] = values
+    else:
+        for tile in tiles:
+            heightmap[tile[0]:tile[1]] = _fbm_tile(tile)
+
+    # Нормализуем высоты от 0 до 1
+    low, high = heightmap.min(), heightmap.max()
+    if high > low:
+        heightmap -= low
+        heightmap /= high - low
+    else:
+        heightmap.fill(0.0)
+    return heightmap
@@ -0,0 +1,356 @@
+import json
+import math
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+_FORMAT_VERSION = 1
+_HEIGHT_DTYPES = {"uint16": np.uint16, "float16": np.float16}
+
+class TerrainTileStore:
+    """Тайловый формат террейна на диске, открываемый через np.memmap.
+
+    Каталог содержит terrain.json (размеры и формат) и два файла: высоты
+    (uint16 с диапазоном из заголовка или float16) и веса splat-карты (uint8).
+    Тайл хранит (tile_size + 1)^2 вершин: граничные вершины дублируются у
+    соседей, поэтому клетки тайла интерполируются без обращения к соседям.
+    Данные тайла лежат на диске непрерывно и читаются одним блоком.
+    """
+
+    HEADER = "terrain.json"
+    HEIGHTS_FILE = "heights.bin"
+    SPLAT_FILE = "splat.bin"
+
+    def __init__(self, path, mode="r"):
+        self.path = path
+        with open(os.path.join(path, self.HEADER), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported terrain tile format: {header.get('version')}")
+
+        self.width = header["width"]
+        self.height = header["height"]
+        self.resolution = header["resolution"]
+        self.tile_size = header["tile_size"]
+        self.height_format = header["height_format"]
+        self.height_min = header["height_min"]
+        self.height_max = header["height_max"]
+        self.splat_channels = header["splat_channels"]
+
+        size = self.tile_size + 1
+        self.tiles_z = max(math.ceil((self.height - 1) / self.tile_size), 1)
+        self.tiles_x = max(math.ceil((self.width - 1) / self.tile_size), 1)
+        self.heights = np.memmap(os.path.join(path, self.HEIGHTS_FILE), dtype=_HEIGHT_DTYPES[self.height_format],
+                                 mode=mode, shape=(self.tiles_z, self.tiles_x, size, size))
+        self.splat = np.memmap(os.path.join(path, self.SPLAT_FILE), dtype=np.uint8, mode=mode,
+                               shape=(self.tiles_z, self.tiles_x, size, size, self.splat_channels))
+
+    @classmethod
+    def create(cls, path, width, height, resolution=1.0, tile_size=256, height_format="uint16",
+               height_range=(0.0, 1.0), splat_channels=4):
+        """Создать пустое хранилище и открыть его на запись"""
+        if height_format not in _HEIGHT_DTYPES:
+            raise ValueError(f"Unknown height format: {height_format}")
+        low, high = float(height_range[0]), float(height_range[1])
+        if high <= low:
+            high = low + 1.0
+
+        os.makedirs(path, exist_ok=True)
+        header = {
+            "version": _FORMAT_VERSION,
+            "width": int(width),
+            "height": int(height),
+            "resolution": float(resolution),
+            "tile_size": int(tile_size),
+            "height_format": height_format,
+            "height_min": low,
+            "height_max": high,
+            "splat_channels": int(splat_channels),
+        }
+        with open(os.path.join(path, cls.HEADER), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2)
+
+        # Файлы создаются нужного размера без заполнения памяти
+        size = tile_size + 1
+        tiles = max(math.ceil((height - 1) / tile_size), 1) * max(math.ceil((width - 1) / tile_size), 1)
+        itemsize = np.dtype(_HEIGHT_DTYPES[height_format]).itemsize
+        for name, length in ((cls.HEIGHTS_FILE, tiles * size * size * itemsize),
+                             (cls.SPLAT_FILE, tiles * size * size * splat_channels)):
+            with open(os.path.join(path, name), "wb") as f:
+                f.truncate(length)
+        return cls(path, mode="r+")
+
+    @property
+    def tile_bytes(self):
+        """Объем тайла в памяти после чтения (высоты float32 + веса uint8)"""
+        size = self.tile_size + 1
+        return size * size * (4 + self.splat_channels)
+
+    def tile_vertex_range(self, tz, tx):
+        """Диапазон вершин тайла [z0, z1) x [x0, x1) в координатах карты"""
+        z0 = tz * self.tile_size
+        x0 = tx * self.tile_size
+        return z0, min(z0 + self.tile_size + 1, self.height), x0, min(x0 + self.tile_size + 1, self.width)
+
+    def encode_heights(self, values):
+        values = np.asarray(values, dtype=np.float32)
+        if self.height_format == "float16":
+            return values.astype(np.float16)
+        scale = 65535.0 / (self.height_max - self.height_min)
+        return np.clip(np.rint((values - self.height_min) * scale), 0, 65535).astype(np.uint16)
+
+    def decode_heights(self, raw):
+        if self.height_format == "float16":
+            return raw.astype(np.float32)
+        scale = np.float32((self.height_max - self.height_min) / 65535.0)
+        return raw.astype(np.float32) * scale + np.float32(self.height_min)
+
+    def read_tile(self, tz, tx):
+        """Высоты (float32) и веса (uint8) вершин тайла"""
+        z0, z1, x0, x1 = self.tile_vertex_range(tz, tx)
+        rows, cols = z1 - z0, x1 - x0
+        heights = self.decode_heights(self.heights[tz, tx, :rows, :cols])
+        splat = np.array(self.splat[tz, tx, :rows, :cols])
+        return heights, splat
+
+    def _tiles_overlapping(self, z0, z1, x0, x1):
+        """Тайлы, содержащие хотя бы одну вершину из [z0, z1) x [x0, x1)"""
+        size = self.tile_size
+        for tz in range(max((z0 - 1) // size, 0), min((z1 - 1) // size + 1, self.tiles_z)):
+            for tx in range(max((x0 - 1) // size, 0), min((x1 - 1) // size + 1, self.tiles_x)):
+                yield tz, tx
+
+    def write_region(self, z0, x0, heights=None, splat=None):
+        """Записать блок вершин, начиная с (z0, x0), во все тайлы, где он хранится"""
+        source = heights if heights is not None else splat
+        z1, x1 = z0 + source.shape[0], x0 + source.shape[1]
+        encoded = None if heights is None else self.encode_heights(heights)
+        for tz, tx in self._tiles_overlapping(z0, z1, x0, x1):
+            tz0, tz1, tx0, tx1 = self.tile_vertex_range(tz, tx)
+            rz0, rz1 = max(z0, tz0), min(z1, tz1)
+            rx0, rx1 = max(x0, tx0), min(x1, tx1)
+            if rz0 >= rz1 or rx0 >= rx1:
+                continue
+            target = (tz, tx, slice(rz0 - tz0, rz1 - tz0), slice(rx0 - tx0, rx1 - tx0))
+            region = (slice(rz0 - z0, rz1 - z0), slice(rx0 - x0, rx1 - x0))
+            if encoded is not None:
+                self.heights[target] = encoded[region]
+            if splat is not None:
+                self.splat[target] = splat[region]
+
+    def read_region(self, z0, z1, x0, x1):
+        """Высоты (float32) и веса (uint8) вершин [z0, z1) x [x0, x1), собранные из тайлов"""
+        heights = np.empty((z1 - z0, x1 - x0), dtype=np.float32)
+        splat = np.empty((z1 - z0, x1 - x0, self.splat_channels), dtype=np.uint8)
+        for tz, tx in self._tiles_overlapping(z0, z1, x0, x1):
+            tz0, tz1, tx0, tx1 = self.tile_vertex_range(tz, tx)
+            rz0, rz1 = max(z0, tz0), min(z1, tz1)
+            rx0, rx1 = max(x0, tx0), min(x1, tx1)
+            if rz0 >= rz1 or rx0 >= rx1:
+                continue
+            source = (tz, tx, slice(rz0 - tz0, rz1 - tz0), slice(rx0 - tx0, rx1 - tx0))
+            region = (slice(rz0 - z0, rz1 - z0), slice(rx0 - x0, rx1 - x0))
+            heights[region] = self.decode_heights(self.heights[source])
+            splat[region] = self.splat[source]
+        return heights, splat
+
+    def flush(self):
+        self.heights.flush()
+        self.splat.flush()
+
+def import_heightmap_image(image_path, path, resolution=1.0, tile_size=256, height_format="uint16",
+                           band_rows=1024):
+    """Конвертировать изображение высот (8 или 16 бит) в тайловое хранилище.
+
+    Пиксели переводятся во float полосами по band_rows строк, поэтому полная
+    float-копия карты в памяти не создается.
+    """
+    from PIL import Image
+
+    image = Image.open(image_path)
+    sixteen_bit = image.mode in ("I;16", "I;16B", "I;16L", "I")
+    if not sixteen_bit and image.mode != "L":
+        image = image.convert("L")
+    scale = 1.0 / 65535.0 if sixteen_bit else 1.0 / 255.0
+
+    store = TerrainTileStore.create(path, image.width, image.height, resolution, tile_size, height_format)
+    for z0 in range(0, image.height, band_rows):
+        z1 = min(z0 + band_rows, image.height)
+        band = np.asarray(image.crop((0, z0, image.width, z1)), dtype=np.float32) * scale
+        store.write_region(z0, 0, heights=band)
+    store.flush()
+    return store
+
+class TerrainTile:
+    """Тайл, загруженный в память"""
+    def __init__(self, tz, tx, z0, x0, heights, splat):
+        self.tz = tz
+        self.tx = tx
+        self.z0 = z0  # Первая вершина тайла в координатах карты
+        self.x0 = x0
+        self.heights = heights
+        self.splat = splat
+
+    @property
+    def nbytes(self):
+        return self.heights.nbytes + self.splat.nbytes
+
+class TerrainStreamer:
+    """Фоновая подгрузка тайлов вокруг камеры с ограничением памяти и вытеснением LRU.
+
+    Чтение и декодирование тайлов выполняется в пуле потоков; готовые тайлы
+    принимаются в update() в основном потоке, поэтому кэш не требует блокировок.
+
+    Это самостоятельный API: Terrain его не создает и не вызывает. Вызывающий код
+    владеет стримером, каждый кадр передает в update() позицию камеры, получает
+    тайлы через on_tile_loaded, get_tile и sample_heights, а в конце вызывает
+    shutdown(). Terrain рисует и редактирует только плотную сетку в памяти.
+    """
+
+    def __init__(self, store, radius=256.0, memory_limit_mb=256, workers=1):
+        self.store = store
+        self.radius = radius  # Радиус подгрузки вокруг камеры в мировых единицах
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.tiles = OrderedDict()  # (tz, tx) -> TerrainTile, от давно использованных к недавним
+        self.memory_used = 0
+        self.on_tile_loaded = None  # callback(tile)
+        self.on_tile_evicted = None  # callback(tile)
+
+        # Статистика
+        self.loaded_count = 0
+        self.evicted_count = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = {}  # (tz, tx) -> Future
+
+    def wanted_tiles(self, camera_position):
+        """Тайлы в радиусе подгрузки, от ближних к дальним"""
+        store = self.store
+        tile_world = store.tile_size * store.resolution
+        cx, cz = float(camera_position[0]), float(camera_position[2])
+
+        tz0 = max(int((cz - self.radius) // tile_world), 0)
+        tz1 = min(int((cz + self.radius) // tile_world) + 1, store.tiles_z)
+        tx0 = max(int((cx - self.radius) // tile_world), 0)
+        tx1 = min(int((cx + self.radius) // tile_world) + 1, store.tiles_x)
+        if tz0 >= tz1 or tx0 >= tx1:
+            return []
+
+        tz, tx = np.mgrid[tz0:tz1, tx0:tx1]
+        # Расстояние от камеры до ближайшей точки прямоугольника тайла
+        dz = np.maximum(np.maximum(tz * tile_world - cz, cz - (tz + 1) * tile_world), 0.0)
+        dx = np.maximum(np.maximum(tx * tile_world - cx, cx - (tx + 1) * tile_world), 0.0)
+        distances = np.hypot(dx, dz).reshape(-1)
+        inside = distances <= self.radius
+        order = np.argsort(distances[inside], kind="stable")
+        keys = np.stack([tz.reshape(-1)[inside], tx.reshape(-1)[inside]], axis=1)[order]
+        return [(int(z), int(x)) for z, x in keys]
+
+    def update(self, camera_position):
+        """Принять загруженные тайлы, запросить недостающие и вытеснить лишние"""
+        self._collect_finished()
+
+        wanted = self.wanted_tiles(camera_position)
+        wanted_set = set(wanted)
+        for key in reversed(wanted):
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+
+        # Запросы тайлов, которые уже не нужны, снимаются
+        for key in [key for key in self._pending if key not in wanted_set]:
+            if self._pending[key].cancel():
+                del self._pending[key]
+
+        # Ближние тайлы запрашиваются первыми, пока хватает памяти
+        tile_bytes = self.store.tile_bytes
+        projected = self.memory_used + len(self._pending) * tile_bytes
+        for key in wanted:
+            if key in self.tiles or key in self._pending:
+                continue
+            if projected + tile_bytes > self.memory_limit:
+                projected -= self._evict(projected + tile_bytes - self.memory_limit, wanted_set)
+                if projected + tile_bytes > self.memory_limit:
+                    break
+            self._pending[key] = self._executor.submit(self._load_tile, key)
+            projected += tile_bytes
+
+        self._evict(self.memory_used - self.memory_limit, wanted_set)
+
+    def _load_tile(self, key):
+        # Выполняется в пуле потоков
+        tz, tx = key
+        z0, _, x0, _ = self.store.tile_vertex_range(tz, tx)
+        heights, splat = self.store.read_tile(tz, tx)
+        return TerrainTile(tz, tx, z0, x0, heights, splat)
+
+    def _collect_finished(self):
+        for key in [key for key, future in self._pending.items() if future.done()]:
+            future = self._pending.pop(key)
+            if future.cancelled():
+                continue
+            try:
+                tile = future.result()
+            except Exception as e:
+                print(f"Error loading terrain tile {key}: {e}")
+                continue
+            self.tiles[key] = tile
+            self.memory_used += tile.nbytes
+            self.loaded_count += 1
+            if self.on_tile_loaded:
+                self.on_tile_loaded(tile)
+
+    def _evict(self, amount, keep=()):
+        """Вытеснить давно использованные тайлы (кроме keep) на amount байт; вернуть освобожденное"""
+        freed = 0
+        if amount <= 0:
+            return freed
+        for key in [key for key in self.tiles if key not in keep]:
+            if freed >= amount:
+                break
+            tile = self.tiles.pop(key)
+            freed += tile.nbytes
+            self.memory_used -= tile.nbytes
+            self.evicted_count += 1
+            if self.on_tile_evicted:
+                self.on_tile_evicted(tile)
+        return freed
+
+    def get_tile(self, tz, tx):
+        """Загруженный тайл или None; обращение обновляет порядок LRU"""
+        tile = self.tiles.get((tz, tx))
+        if tile is not None:
+            self.tiles.move_to_end((tz, tx))
+        return tile
+
+    def sample_heights(self, points):
+        """Высоты в точках (N, 2) по (x, z) из загруженных тайлов; NaN, если тайл не загружен"""
+        store = self.store
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        grid_x = np.clip(points[:, 0] / store.resolution, 0.0, store.width - 1)
+        grid_z = np.clip(points[:, 1] / store.resolution, 0.0, store.height - 1)
+        cell_x = np.minimum(grid_x.astype(np.intp), store.width - 2)
+        cell_z = np.minimum(grid_z.astype(np.intp), store.height - 2)
+        tile_keys = (cell_z // store.tile_size) * store.tiles_x + cell_x // store.tile_size
+
+        result = np.full(len(points), np.nan)
+        for key in np.unique(tile_keys):
+            tile = self.tiles.get(divmod(int(key), store.tiles_x))
+            if tile is None:
+                continue
+            selected = np.nonzero(tile_keys == key)[0]
+            z0 = cell_z[selected] - tile.z0
+            x0 = cell_x[selected] - tile.x0
+            dx = grid_x[selected] - cell_x[selected]
+            dz = grid_z[selected] - cell_z[selected]
+            h = tile.heights
+            top = h[z0, x0] * (1.0 - dx) + h[z0, x0 + 1] * dx
+            bottom = h[z0 + 1, x0] * (1.0 - dx) + h[z0 + 1, x0 + 1] * dx
+            result[selected] = top * (1.0 - dz) + bottom * dz
+        return result
+
+    def shutdown(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
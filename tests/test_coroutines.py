@@ -0,0 +1,30 @@
+from core.scripting import MonoBehaviour, ScriptEngine, WaitForSeconds
+
+
+class _Waiter(MonoBehaviour):
+    def __init__(self):
+        super().__init__()
+        self.started = False
+        self.resumed_frame = None
+        self.frame = 0
+
+    def Update(self, delta_time):
+        self.frame += 1
+        if not self.started:
+            self.started = True
+            self.StartCoroutine(self.wait())
+
+    def wait(self):
+        yield WaitForSeconds(0)
+        self.resumed_frame = self.frame
+
+
+def test_wait_for_seconds_zero_resumes_next_frame():
+    # Ожидание, начатое в Update, не должно закончиться в том же кадре
+    engine = ScriptEngine()
+    script = _Waiter()
+    engine.register_script(script)
+    engine.update(0.016)
+    assert script.resumed_frame is None
+    engine.update(0.016)
+    assert script.resumed_frame == 2
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("PyQt5")
+
+from core.objects import GameObject
+from core.scene import Scene
+
+
+def _perspective(fov_y, aspect, near, far):
+    f = 1.0 / np.tan(np.radians(fov_y) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+
+def test_lone_occluder_is_visible():
+    # Бокс окклюдера по scale больше бокса проверки по коллайдеру: куб не должен перекрыть сам себя
+    scene = Scene()
+    cube = GameObject("Cube", position=(0.0, 0.0, -10.0), primitive_type=GameObject.PRIMITIVE_CUBE)
+    cube.scale = [4.0, 4.0, 4.0]
+    cube.add_collider(size=(1.0, 1.0, 1.0))
+    scene.add_object(cube)
+
+    view = np.eye(4)
+    scene.set_camera(np.zeros(3), view, _perspective(60.0, 2.0, 0.1, 100.0))
+    assert scene.occlusion_culler is not None
+    assert scene._apply_occlusion_culling([cube]) == [cube]
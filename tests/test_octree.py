@@ -0,0 +1,23 @@
+from core.optimization import Octree
+
+
+def test_update_after_collapse_keeps_object_reachable():
+    # Перевставка после удаления соседа: _collapse не должен отрезать узел, куда попал объект
+    root = Octree([-100, -100, -100, 100, 100, 100], max_objects=1)
+    a, b = object(), object()
+    root.insert(a, [1, 1, 1, 2, 2, 2])
+    root.insert(b, [3, 3, 3, 4, 4, 4])
+    root.remove(b)
+
+    # Новая ячейка - предок текущего узла A, но не корень
+    assert root.locations[a].depth >= 2
+    moved = [120, 120, 120, 121, 121, 121]
+    assert root.update(a, moved)
+    assert root.query([110, 110, 110, 130, 130, 130]) == [a]
+
+    # Узел объекта должен быть достижим от корня
+    node = root.locations[a]
+    while node.parent is not None:
+        assert node in node.parent.children
+        node = node.parent
+    assert node is root
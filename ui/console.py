@@ -1,4 +1,7 @@
-from PyQt5.QtWidgets import QTextEdit
+from PyQt5.QtWidgets import (
+    QTextEdit, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QDoubleSpinBox,
+    QTableWidget, QTableWidgetItem, QHeaderView
+)
 from PyQt5.QtGui import QColor, QTextCharFormat, QFont
 from datetime import datetime
 
@@ -38,4 +41,52 @@ class Console(QTextEdit):
         
     def clear_console(self):
         self.clear()
-        self.append_info("Console cleared")
\ No newline at end of file
+        self.append_info("Console cleared")
+
+class ScriptProfilerPanel(QWidget):
+    """Живая таблица самых дорогих методов скриптов рядом с консолью"""
+    COLUMNS = ("Script", "Method", "Calls", "Total ms", "Avg us", "Max ms")
+    
+    def __init__(self, rows=10):
+        super().__init__()
+        self.profiler = None
+        self.rows = rows
+        self.setMaximumHeight(200)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("Frame budget (ms):"))
+        self.budget_spin = QDoubleSpinBox()
+        self.budget_spin.setRange(0.0, 100.0)
+        self.budget_spin.setSingleStep(0.5)
+        self.budget_spin.setDecimals(2)
+        self.budget_spin.valueChanged.connect(self.set_budget)
+        budget_layout.addWidget(self.budget_spin)
+        budget_layout.addStretch()
+        layout.addLayout(budget_layout)
+        
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.table)
+        
+    def set_profiler(self, profiler):
+        self.profiler = profiler
+        if profiler:
+            self.budget_spin.setValue(profiler.frame_budget_ms)
+        
+    def set_budget(self, value):
+        if self.profiler:
+            self.profiler.frame_budget_ms = value
+        
+    def refresh(self):
+        rows = self.profiler.top(self.rows) if self.profiler else []
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                text = f"{value:.3f}" if isinstance(value, float) else str(value)
+                self.table.setItem(row, column, QTableWidgetItem(text))
\ No newline at end of file
@@ -110,6 +110,7 @@ class GLWidget(QOpenGLWidget):
         glLightModelfv(GL_LIGHT_MODEL_AMBIENT, self.scene.ambient_light)
         
         self.update_camera()
+        self.update_frustum()
         
         if self.wireframe_mode or self.shading_mode == 2:
             glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
@@ -126,8 +127,9 @@ class GLWidget(QOpenGLWidget):
         if self.show_axes:
             self.draw_axes()
         
-        for obj in self.scene.objects:
+        for obj in self.scene.get_visible_objects():
             self.draw_object(obj)
+        self.scene.draw_terrain(self.height())
         
         if self.show_colliders:
             self.draw_colliders()
@@ -143,6 +145,12 @@ class GLWidget(QOpenGLWidget):
         glRotatef(self.camera_rotation[1], 0, 1, 0)
         glTranslatef(-self.camera_position[0], -self.camera_position[1], -self.camera_position[2])
 
+    def update_frustum(self):
+        # Матрицы OpenGL хранятся по столбцам
+        view = np.array(glGetFloatv(GL_MODELVIEW_MATRIX), dtype=np.float64).reshape(4, 4).T
+        projection = np.array(glGetFloatv(GL_PROJECTION_MATRIX), dtype=np.float64).reshape(4, 4).T
+        self.scene.set_camera(self.camera_position, view, projection)
+
     def mousePressEvent(self, event):
         if event.button() == Qt.RightButton:
             self.is_rotating = True
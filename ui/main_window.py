@@ -1,3 +1,5 @@
+import os
+
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QListWidget, QLabel, QLineEdit, QColorDialog, QGridLayout,
@@ -13,7 +15,7 @@ from core.objects import GameObject
 from core.lighting import Light
 from core.post_processing import BloomEffect, ColorGradingEffect
 from .gl_widget import GLWidget
-from .console import Console
+from .console import Console, ScriptProfilerPanel
 from .hierarchy import HierarchyPanel
 from .inspector import InspectorPanel
 
@@ -85,6 +87,7 @@ class MainWindow(QMainWindow):
         self.status_timer = QTimer(self)
         self.status_timer.timeout.connect(self.update_statusbar)
         self.status_timer.start(100)
+        self.profiler_ticks = 0
 
     def create_lighting_tab(self):
         tab = QWidget()
@@ -258,6 +261,12 @@ class MainWindow(QMainWindow):
         # Tools menu
         tools_menu = menubar.addMenu("&Tools")
         tools_menu.addAction("&Bake Lighting", self.bake_lighting)
+        tools_menu.addSeparator()
+        self.profiler_action = tools_menu.addAction("Script &Profiler")
+        self.profiler_action.setCheckable(True)
+        self.profiler_action.toggled.connect(self.toggle_script_profiler)
+        tools_menu.addAction("&Reset Script Profiler", self.reset_script_profiler)
+        tools_menu.addAction("&Watch Scripts Folder...", self.watch_scripts_folder)
 
         # Play menu
         play_menu = menubar.addMenu("&Play")
@@ -305,8 +314,13 @@ class MainWindow(QMainWindow):
 
         # Console dock
         console_dock = QDockWidget("Console", self)
+        console_splitter = QSplitter(Qt.Horizontal)
         self.console = Console()
-        console_dock.setWidget(self.console)
+        self.profiler_panel = ScriptProfilerPanel()
+        self.profiler_panel.hide()
+        console_splitter.addWidget(self.console)
+        console_splitter.addWidget(self.profiler_panel)
+        console_dock.setWidget(console_splitter)
         self.addDockWidget(Qt.BottomDockWidgetArea, console_dock)
 
     def create_statusbar(self):
@@ -317,11 +331,13 @@ class MainWindow(QMainWindow):
         self.object_label = QLabel("Objects: 0")
         self.light_label = QLabel("Lights: 0")
         self.camera_label = QLabel("Camera: (0, 2, 8)")
+        self.occlusion_label = QLabel("Occluded: 0%")
         
         self.statusbar.addPermanentWidget(self.fps_label)
         self.statusbar.addPermanentWidget(self.object_label)
         self.statusbar.addPermanentWidget(self.light_label)
         self.statusbar.addPermanentWidget(self.camera_label)
+        self.statusbar.addPermanentWidget(self.occlusion_label)
 
     def setup_shortcuts(self):
         shortcuts = {
@@ -459,10 +475,20 @@ class MainWindow(QMainWindow):
                 self.console.append_error("Failed to load scene")
 
     def undo(self):
-        self.console.append_info("Undo performed")
+        terrain = getattr(self.scene, 'terrain', None)
+        stroke = terrain.history.undo() if terrain is not None else None
+        if stroke is not None:
+            self.console.append_info(f"Undo: terrain {stroke.name}")
+        else:
+            self.console.append_info("Nothing to undo")
 
     def redo(self):
-        self.console.append_info("Redo performed")
+        terrain = getattr(self.scene, 'terrain', None)
+        stroke = terrain.history.redo() if terrain is not None else None
+        if stroke is not None:
+            self.console.append_info(f"Redo: terrain {stroke.name}")
+        else:
+            self.console.append_info("Nothing to redo")
 
     def create_empty(self):
         from core.objects import GameObject
@@ -565,6 +591,38 @@ class MainWindow(QMainWindow):
         self.scene.stop()
         self.console.append_info("Play mode stopped")
 
+    def toggle_script_profiler(self, enabled):
+        engine = self.scene.script_engine
+        if not engine:
+            self.console.append_warning("Script engine is not available")
+            return
+        profiler = engine.profiler
+        profiler.enabled = enabled
+        profiler.on_warning = self.console.append_warning
+        self.profiler_panel.set_profiler(profiler)
+        self.profiler_panel.setVisible(enabled)
+        self.console.append_info(f"Script profiler {'enabled' if enabled else 'disabled'}")
+
+    def reset_script_profiler(self):
+        if self.scene.script_engine:
+            self.scene.script_engine.profiler.reset()
+            self.profiler_panel.refresh()
+            self.console.append_info("Script profiler reset")
+
+    def watch_scripts_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Scripts Folder")
+        if not folder:
+            return
+        watcher = self.scene.watch_scripts(folder)
+        if not watcher:
+            self.console.append_warning("Script engine is not available")
+            return
+        watcher.on_reload = lambda path, count: self.console.append_success(
+            f"Reloaded {os.path.basename(path)} ({count} live instances)")
+        watcher.on_error = lambda path: self.console.append_error(
+            f"Failed to reload {os.path.basename(path)}, keeping previous version")
+        self.console.append_info(f"Watching scripts in {folder}")
+
     def show_about(self):
         QMessageBox.about(self, "About 3D Editor",
                          "Professional 3D Engine Editor\n\n"
@@ -583,6 +641,16 @@ class MainWindow(QMainWindow):
         
         cam_pos = self.viewport.camera_position
         self.camera_label.setText(f"Camera: ({cam_pos[0]:.1f}, {cam_pos[1]:.1f}, {cam_pos[2]:.1f})")
+        
+        if self.scene.occlusion_culler:
+            self.occlusion_label.setText(f"Occluded: {self.scene.occlusion_culler.culled_percentage:.0f}%")
+        
+        # Таблица профилировщика обновляется раз в полсекунды
+        if self.profiler_panel.isVisible():
+            self.profiler_ticks += 1
+            if self.profiler_ticks >= 5:
+                self.profiler_ticks = 0
+                self.profiler_panel.refresh()
 
 if __name__ == "__main__":
     import sys
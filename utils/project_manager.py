@@ -93,6 +93,11 @@ class Project:
         if self.path:
             return os.path.dirname(self.path)
         return ""
+    
+    def get_scripts_folder(self):
+        """Получить папку скриптов проекта"""
+        folder = self.get_project_folder()
+        return os.path.join(folder, "Scripts") if folder else ""
 
 class ProjectManager:
     def __init__(self):
@@ -124,8 +129,9 @@ class ProjectManager:
         
         return False, "Failed to create project"
     
-    def load_project(self, path):
-        """Загрузить проект"""
+    def load_project(self, path, script_engine=None, precompile_workers=0):
+        """Загрузить проект; с script_engine скрипты проекта сразу компилируются в кэш
+        (precompile_workers процессов, 0 - по числу ядер)"""
         if not os.path.exists(path):
             return False, "Project file not found"
             
@@ -133,6 +139,10 @@ class ProjectManager:
         if project.load(path):
             self.current_project = project
             self._add_to_recent(path)
+            
+            scripts_folder = project.get_scripts_folder()
+            if script_engine and os.path.isdir(scripts_folder):
+                script_engine.precompile_scripts(scripts_folder, precompile_workers)
             return True, "Project loaded successfully"
             
         return False, "Failed to load project"